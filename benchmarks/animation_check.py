@@ -0,0 +1,75 @@
+import os
+import sys
+import json
+import random
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageSequence
+
+from zoop.engine import ConversionEngine, make_jobs, default_workers
+from benchmarks.convert_bench import synthetic_image
+
+ANIMATION_TARGETS = ['.gif', '.png', '.webp']
+
+
+def animation_info(path):
+    with Image.open(path) as image:
+        durations = []
+        for frame in ImageSequence.Iterator(image):
+            frame.load()
+            durations.append(int(frame.info.get('duration', 0)))
+        loop = image.info.get('loop')
+        plays_once = loop is None if image.format == 'GIF' else loop == 1
+        return {'frames': len(durations), 'durations': durations, 'plays_once': plays_once}
+
+
+def check_animations(workers):
+    # Round trips a looping and a play-once GIF (P first frame, RGB after)
+    # through every animated target and reports what did not survive.
+    failures = []
+    directory = tempfile.mkdtemp(prefix='zoop-anim-')
+    try:
+        rng = random.Random('animations')
+        frames = [synthetic_image(rng, (64, 48), 'RGB') for _ in range(3)]
+        sources = []
+        for name, loop in (('loop', {'loop': 0}), ('once', {})):
+            path = os.path.join(directory, name + '.gif')
+            frames[0].save(path, save_all=True, append_images=frames[1:], duration=[40, 80, 120], **loop)
+            sources.append(path)
+        expected = {path: animation_info(path) for path in sources}
+
+        with ConversionEngine(workers=workers) as engine:
+            for target_ext in ANIMATION_TARGETS:
+                output_dir = os.path.join(directory, 'out' + target_ext)
+                os.makedirs(output_dir)
+                options = {'same_format': 'reencode'}
+                for result in engine.run(make_jobs(sources, output_dir, target_ext, options)):
+                    if not result.ok:
+                        failures.append({'source': result.source, 'target': result.target, 'error': result.error})
+                        continue
+                    got = animation_info(result.target)
+                    if got != expected[result.source]:
+                        failures.append({'source': result.source, 'target': result.target, 'expected': expected[result.source], 'got': got})
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    return failures
+
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Zoop animation round trip check')
+    parser.add_argument('--workers', type=int, default=default_workers())
+    args = parser.parse_args(argv)
+
+    failures = check_animations(args.workers)
+    print(json.dumps({'targets': ANIMATION_TARGETS, 'failures': failures}, indent=2))
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,290 @@
+import os
+import io
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageDraw
+
+from zoop.engine import ConversionEngine, make_jobs, default_workers
+from zoop.formats import SUPPORTED_FILES_EXT, format_for_ext
+from zoop.modes import normalize_image
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+CORPUS_SIZES = {
+    'small': [(320, 240), (640, 480)],
+    'medium': [(640, 480), (1280, 960), (1920, 1080)],
+    'large': [(1280, 960), (3000, 2000), (6000, 4000)],
+}
+ICO_MAX_SIZE = 256
+GIF_FRAMES = 8
+
+# Metrics where a bigger number is better, everything else is a cost.
+HIGHER_IS_BETTER = ('files_per_sec', 'mpix_per_sec')
+
+
+def synthetic_image(rng, size, mode):
+    # Smooth gradients, random shapes and upscaled noise: deterministic for a
+    # given seed and closer to real photos than flat colours for encoders.
+    noise = Image.frombytes('RGB', (32, 32), rng.randbytes(32 * 32 * 3)).resize(size, Image.BICUBIC)
+    gradient = Image.linear_gradient('L').resize(size).convert('RGB')
+    image = Image.blend(noise, gradient, 0.5)
+
+    draw = ImageDraw.Draw(image)
+    for _ in range(12):
+        x0, y0 = rng.randrange(size[0]), rng.randrange(size[1])
+        x1, y1 = x0 + rng.randrange(1, size[0] // 2 + 2), y0 + rng.randrange(1, size[1] // 2 + 2)
+        color = (rng.randrange(256), rng.randrange(256), rng.randrange(256))
+        if rng.random() < 0.5:
+            draw.ellipse((x0, y0, x1, y1), fill=color)
+        else:
+            draw.rectangle((x0, y0, x1, y1), fill=color)
+
+    if mode == 'RGBA':
+        alpha = Image.radial_gradient('L').resize(size)
+        image.putalpha(alpha)
+
+    return image
+
+
+def corpus_spec(scale, repeat):
+    spec = []
+    for ext in SUPPORTED_FILES_EXT:
+        for size in CORPUS_SIZES[scale]:
+            if ext == '.ico':
+                size = (min(size[0], ICO_MAX_SIZE), min(size[1], ICO_MAX_SIZE))
+
+            variants = ['RGB']
+            if ext in ('.png', '.webp', '.ico'):
+                variants.append('RGBA')
+            if ext in ('.gif', '.webp'):
+                variants.append('animated')
+
+            for variant in variants:
+                for n in range(repeat):
+                    spec.append((ext, size, variant, n))
+    return spec
+
+
+def generate_corpus(directory, scale='small', repeat=1, seed=1234):
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for ext, size, variant, n in corpus_spec(scale, repeat):
+        name = '{}_{}x{}_{}_{}{}'.format(ext[1:], size[0], size[1], variant, n, ext)
+        path = os.path.join(directory, name)
+        paths.append(path)
+        if os.path.exists(path):
+            continue
+
+        rng = random.Random('{}:{}'.format(seed, name))
+        if variant == 'animated':
+            frames = [synthetic_image(rng, size, 'RGB') for _ in range(GIF_FRAMES)]
+            frames[0].save(path, save_all=True, append_images=frames[1:], duration=80, loop=0)
+        else:
+            image = synthetic_image(rng, size, variant)
+            if ext in ('.jpg', '.jpeg', '.bmp') and image.mode != 'RGB':
+                image = image.convert('RGB')
+            image.save(path)
+
+    return paths
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(int(round(pct / 100.0 * (len(values) - 1))), len(values) - 1)
+    return values[index]
+
+
+def latency_stats(values):
+    return {
+        'count': len(values),
+        'p50_ms': round(percentile(values, 50) * 1000, 3) if values else None,
+        'p95_ms': round(percentile(values, 95) * 1000, 3) if values else None,
+        'mean_ms': round(statistics.mean(values) * 1000, 3) if values else None,
+    }
+
+
+def peak_rss_bytes(who='self'):
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF if who == 'self' else resource.RUSAGE_CHILDREN)
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    return usage.ru_maxrss if sys.platform == 'darwin' else usage.ru_maxrss * 1024
+
+
+def encodable(image, format_name):
+    return normalize_image(image, format_name)[0]
+
+
+def bench_codecs(paths, targets):
+    decode = {}
+    encode = {}
+    for path in paths:
+        source_ext = os.path.splitext(path)[1]
+        start = time.perf_counter()
+        with Image.open(path) as image:
+            image.load()
+            decoded = image.copy()
+        elapsed = time.perf_counter() - start
+
+        entry = decode.setdefault(source_ext, {'latencies': [], 'pixels': 0})
+        entry['latencies'].append(elapsed)
+        entry['pixels'] += decoded.width * decoded.height
+
+        for target_ext in targets:
+            format_name = format_for_ext(target_ext)
+            image = encodable(decoded, format_name)
+            buffer = io.BytesIO()
+            start = time.perf_counter()
+            image.save(buffer, format=format_name)
+            elapsed = time.perf_counter() - start
+
+            entry = encode.setdefault(target_ext, {'latencies': [], 'pixels': 0, 'bytes': 0})
+            entry['latencies'].append(elapsed)
+            entry['pixels'] += image.width * image.height
+            entry['bytes'] += buffer.tell()
+
+    def summarize(table):
+        report = {}
+        for ext, entry in sorted(table.items()):
+            total = sum(entry['latencies'])
+            stats = latency_stats(entry['latencies'])
+            stats['mpix_per_sec'] = round(entry['pixels'] / 1e6 / total, 3) if total else None
+            if 'bytes' in entry:
+                stats['output_bytes'] = entry['bytes']
+            report[ext] = stats
+        return report
+
+    return summarize(decode), summarize(encode)
+
+
+def bench_engine(paths, targets, workers):
+    report = {}
+    output_root = tempfile.mkdtemp(prefix='zoop-bench-')
+    try:
+        with ConversionEngine(workers=workers) as engine:
+            for target_ext in targets:
+                output_dir = os.path.join(output_root, target_ext[1:])
+                os.makedirs(output_dir)
+
+                latencies = []
+                failures = 0
+                start = time.perf_counter()
+                # Same-format sources would otherwise be copied, not converted.
+                for result in engine.run(make_jobs(paths, output_dir, target_ext, {'same_format': 'reencode'})):
+                    latencies.append(result.elapsed)
+                    failures += not result.ok
+                elapsed = time.perf_counter() - start
+
+                output_bytes = sum(entry.stat().st_size for entry in os.scandir(output_dir))
+                stats = latency_stats(latencies)
+                stats.update({
+                    'files_per_sec': round(len(latencies) / elapsed, 3) if elapsed else None,
+                    'failures': failures,
+                    'output_bytes': output_bytes,
+                })
+                report[target_ext] = stats
+    finally:
+        shutil.rmtree(output_root, ignore_errors=True)
+
+    return report
+
+
+def flatten(report, prefix=''):
+    for key, value in report.items():
+        name = prefix + key
+        if isinstance(value, dict):
+            yield from flatten(value, name + '/')
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield name, value
+
+
+def compare(report, baseline, tolerance):
+    current = dict(flatten(report['results']))
+    regressions = []
+    for name, before in flatten(baseline['results']):
+        after = current.get(name)
+        if after is None or not before:
+            continue
+
+        # peak_rss_bytes is a group (main/workers), the other metrics are
+        # the last segment of their path.
+        metric = name.rsplit('/', 1)[-1]
+        if not (metric.endswith('_ms') or metric in HIGHER_IS_BETTER or metric == 'output_bytes'
+                or name.startswith('peak_rss_bytes/')):
+            continue
+
+        change = (after - before) / before
+        if metric in HIGHER_IS_BETTER:
+            change = -change
+
+        if change > tolerance:
+            regressions.append({'metric': name, 'baseline': before, 'current': after, 'change': round(change, 4)})
+
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Zoop conversion benchmark')
+    parser.add_argument('--corpus', default=os.path.join(tempfile.gettempdir(), 'zoop-bench-corpus'), help='corpus directory (generated if missing)')
+    parser.add_argument('--scale', choices=sorted(CORPUS_SIZES), default='small')
+    parser.add_argument('--repeat', type=int, default=1, help='images per format/size/variant')
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--targets', nargs='+', default=['.jpg', '.png', '.webp'], help='output formats to benchmark')
+    parser.add_argument('--workers', type=int, default=default_workers())
+    parser.add_argument('--output', help='write the JSON report to this file')
+    parser.add_argument('--baseline', help='compare against a previously saved report')
+    parser.add_argument('--tolerance', type=float, default=0.10, help='allowed relative regression (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    corpus_dir = os.path.join(args.corpus, '{}-{}-{}'.format(args.scale, args.repeat, args.seed))
+    paths = generate_corpus(corpus_dir, args.scale, args.repeat, args.seed)
+
+    decode, encode = bench_codecs(paths, args.targets)
+    engine = bench_engine(paths, args.targets, args.workers)
+
+    report = {
+        'corpus': {'scale': args.scale, 'repeat': args.repeat, 'seed': args.seed, 'files': len(paths)},
+        'environment': {
+            'python': sys.version.split()[0],
+            'pillow': Image.__version__,
+            'cpu_count': os.cpu_count(),
+            'workers': args.workers,
+        },
+        'results': {
+            'decode': decode,
+            'encode': encode,
+            'engine': engine,
+            'peak_rss_bytes': {'main': peak_rss_bytes('self'), 'workers': peak_rss_bytes('children')},
+        },
+    }
+
+    status = 0
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            report['regressions'] = compare(report, json.load(f), args.tolerance)
+        status = 1 if report['regressions'] else 0
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    print(text)
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
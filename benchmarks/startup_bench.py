@@ -0,0 +1,81 @@
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+ZOOP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in a fresh interpreter every time so nothing is warm but the OS file
+# cache. Creating the window needs a display, without one only the imports
+# are measured.
+CHILD = """
+import sys, json, time
+start = time.perf_counter()
+import main
+timings = {'import': time.perf_counter() - start}
+try:
+    window = main.Window()
+except Exception as e:
+    timings['window_error'] = '{}: {}'.format(type(e).__name__, e)
+else:
+    window.update()
+    timings['window'] = time.perf_counter() - start
+    window.destroy()
+print(json.dumps(timings))
+"""
+
+
+def run_once():
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', CHILD], cwd=ZOOP_ROOT, capture_output=True, text=True, check=True).stdout
+    timings = json.loads(output.strip().splitlines()[-1])
+    timings['process'] = time.perf_counter() - start
+    return timings
+
+
+def summarize(values):
+    return {
+        'min': round(min(values), 4),
+        'median': round(statistics.median(values), 4),
+        'max': round(max(values), 4),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Zoop startup benchmark')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--max-seconds', type=float, default=1.5,
+                        help='fail when the median time to a drawn window (or to import without a display) exceeds this (default: %(default)s)')
+    parser.add_argument('--output', help='write the JSON report to this file')
+    args = parser.parse_args(argv)
+
+    runs = [run_once() for _ in range(max(args.runs, 1))]
+    report = {
+        'python': sys.version.split()[0],
+        'runs': len(runs),
+        'max_seconds': args.max_seconds,
+    }
+    for phase in ('import', 'window', 'process'):
+        values = [run[phase] for run in runs if phase in run]
+        if values:
+            report[phase] = summarize(values)
+    if 'window' not in report:
+        report['window_error'] = runs[0].get('window_error')
+
+    measured = report.get('window', report['import'])['median']
+    report['within_target'] = measured <= args.max_seconds
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    print(text)
+
+    return 0 if report['within_target'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,19 +1,77 @@
 import tkinter as tk
 import tkinter.ttk as ttk
 import tkinter.tix as tix
+import tkinter.font as tkfont
 from tkinter.filedialog import askdirectory, askopenfilename, asksaveasfilename, askopenfilenames
-from PIL import Image, ImageTk
+from PIL import Image
 import os
-import json
+import itertools
+from array import array
 import pickle
+import sqlite3
+
+from zoop.engine import make_jobs, default_workers
+from zoop.background import ConversionTask, format_duration
+from zoop.formats import SUPPORTED_FILES_EXT, is_supported, format_for_ext
+from zoop.scan import iter_directory
+from zoop.jobs import JobTable
+from zoop.manifest import Manifest
+from zoop.dedup import Deduplicator
+from zoop.metrics import MetricsSink, default_metrics_path, prune_metrics
+from zoop.logbuffer import LogBuffer, LOG_CAPACITY, file_logger
+from zoop.profiles import PROFILE_NAMES, DEFAULT_PROFILE, save_options
+from zoop.frames import FRAME_MODES, DEFAULT_FRAME_MODE
+from zoop.memory import BOMB_POLICIES, DEFAULT_BOMB_POLICY, default_memory_budget
+from zoop.resize import RESIZE_MODES, RESAMPLING_FILTERS, DEFAULT_FILTER, parse_resize
+from zoop.thumbnails import ThumbnailCache, THUMBNAIL_MEMORY_BUDGET
+from zoop.probe import ProbeCache
+from zoop.jobstore import JobStore
+from zoop.icons import ICON_SIZE, scaled_icon_path
+from zoop.passthrough import SAME_FORMAT_MODES, DEFAULT_SAME_FORMAT, METADATA_POLICIES, DEFAULT_METADATA
+from zoop.tree import source_root
+from zoop.target import TARGET_SIZE_FORMATS, parse_target_size
+from zoop.modes import ICC_POLICIES, DEFAULT_ICC_POLICY, DEFAULT_BACKGROUND, parse_background
+from zoop.watch import WatchTask
+from zoop.writer import FSYNC_POLICIES, DEFAULT_FSYNC, DEFAULT_IO_WORKERS
+from zoop.formats import ZOOP_ROOT
 
 
 # ZOOP_PATH = os.getcwd()
 ZOOP_PATH = os.getcwd() + '\\converted\\'
 VERSION = "VAlpha"
+CONVERSION_POLL_MS = 100
+INGEST_CHUNK_SIZE = 500
+PREVIEW_POLL_MS = 50
+PROBE_POLL_MS = 200
+LOG_FLUSH_MS = 100
+THEME_DIR = os.path.join(ZOOP_ROOT, 'theme')
+AW_THEMES = ('awdark', 'awlight')
+DEFAULT_THEME = 'awdark'
+ICONS = {}
+
+
+def load_icon(path, size=ICON_SIZE):
+    # Icons are pre-scaled on disk once and every frame or message box
+    # shares the same PhotoImage afterwards.
+    key = (path, size)
+    if key not in ICONS:
+        try:
+            ICONS[key] = tk.PhotoImage(file=scaled_icon_path(path, size))
+        except (OSError, tk.TclError):
+            from PIL import ImageTk
+
+            with Image.open(path) as image:
+                ICONS[key] = ImageTk.PhotoImage(image.resize(size, Image.LANCZOS))
+    return ICONS[key]
+
+def format_bytes(size):
+    if size < 1024:
+        return '{} B'.format(size)
 
-with open('res/supported.json', 'r') as supported_files:
-    SUPPORTED_FILES_EXT = json.load(supported_files)
+    for unit in ('KB', 'MB', 'GB'):
+        size /= 1024
+        if size < 1024 or unit == 'GB':
+            return '{:.1f} {}'.format(size, unit)
 
 
 class MenuBar(ttk.Frame):
@@ -30,6 +88,7 @@ class MenuBar(ttk.Frame):
                         relief=tk.FLAT)
 
         menu.add_command(label='📂 Add image(s) to convert', command=self.parent.callOpenImg, accelerator='Ctrl+A')
+        menu.add_command(label='📁 Add folder to convert', command=self.parent.callOpenFolder, accelerator='Ctrl+F')
         menu.add_command(label='✂ Delete selected image(s)', accelerator='Ctrl+D', command=self.parent.callRemoveImage)
         menu.add_command(label='🗑 Clear image list', accelerator='Ctrl+Alt+D', command=self.parent.callRemoveAll)
         menu.add_separator()
@@ -48,7 +107,7 @@ class MenuBar(ttk.Frame):
                         relief=tk.FLAT)
 
         self.style = ttk.Style()
-        for theme in self.style.theme_names():
+        for theme in self.parent.available_themes():
             sub_menu.add_radiobutton(label=theme, value=theme, variable=self.theme_opt_var, command=self.switch_theme)
 
         menu.add_cascade(label='🎨 Application Theme', menu=sub_menu)
@@ -65,6 +124,12 @@ class MenuBar(ttk.Frame):
         
         menu.add_command(label='✔ Convert All', accelerator='Ctrl+O', command=self.parent.callConvertAll)
         menu.add_command(label='📌Convert Selected', accelerator='Ctrl+L', command=self.parent.callConvertSelected)
+        menu.add_separator()
+        menu.add_command(label='✖ Cancel conversion', accelerator='Ctrl+K', command=self.parent.callCancelConversion)
+        menu.add_separator()
+        menu.add_command(label='👁 Watch a folder...', accelerator='Ctrl+W', command=self.parent.callWatchFolder)
+        menu.add_command(label='⏹ Stop watching', command=self.parent.callStopWatching)
+        menu.add_command(label='📊 Last conversion metrics', command=self.parent.callShowMetrics)
 
         self.convert_menu.config(menu=menu)
 
@@ -98,9 +163,13 @@ https://www.github.com/MartinGate/Zoop
         credits_label.pack(anchor='nw', padx=12)
 
     def switch_theme(self):
+        if not self.parent.load_theme(self.theme_opt_var.get()):
+            self.theme_opt_var.set(self.parent.data['theme'])
+            return
+
         self.parent.theme.theme_use(self.theme_opt_var.get())
-        with open('preferences.zoopdat', 'wb') as rec:
-            pickle.dump({'theme': self.theme_opt_var.get()}, rec)
+        self.parent.data['theme'] = self.theme_opt_var.get()
+        self.parent.save_preferences()
 
         self.parent.optionsFrame.logview.logviewcanvas.config(bg=self.style.lookup('TFrame', 'background'),
                                                                 highlightbackground=self.style.lookup('TFrame', 'background'))
@@ -121,7 +190,160 @@ class ZoopTooltip(tix.Balloon):
         self.bind_widget(obj, balloonmsg=msg)
 
 
+class ZoopVirtualList(ttk.Frame):
+    def __init__(self, parent, columns, formatter):
+        ttk.Frame.__init__(self, parent)
+        self.parent = parent
+        self.formatter = formatter
+        self.keys = array('q')
+        self.selected = set()
+        self.offset = 0
+        self.visible_count = 1
+        # Position of the focused row in keys, None until a row gets it.
+        self.cursor = None
+
+        self.tree = ttk.Treeview(self, columns=columns, show='headings', selectmode='extended')
+        self.scrollbar = ttk.Scrollbar(self, orient='vertical', command=self.yview)
+
+        self.tree.pack(expand=tk.YES, fill=tk.BOTH, side=tk.LEFT)
+        self.scrollbar.pack(fill=tk.Y, expand=tk.NO, side=tk.RIGHT)
+
+        self.tree.bind('<Configure>', self._on_configure)
+        self.tree.bind('<ButtonPress-1>', self._on_press)
+        self.tree.bind('<<TreeviewSelect>>', self._on_select)
+        self.tree.bind('<MouseWheel>', self._on_mousewheel)
+        self.tree.bind('<Button-4>', lambda evt: self._scroll_units(-3))
+        self.tree.bind('<Button-5>', lambda evt: self._scroll_units(3))
+        self.tree.bind('<Up>', lambda evt: self._move_cursor(-1))
+        self.tree.bind('<Down>', lambda evt: self._move_cursor(1))
+
+    def column(self, *args, **kwargs):
+        return self.tree.column(*args, **kwargs)
+
+    def heading(self, *args, **kwargs):
+        return self.tree.heading(*args, **kwargs)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def append(self, keys):
+        self.keys.extend(keys)
+        self._render()
+
+    def delete(self, keys):
+        keys = set(keys)
+        self.keys = array('q', (key for key in self.keys if key not in keys))
+        self.selected -= keys
+        self.cursor = None
+        self.scroll_to(self.offset)
+
+    def clear(self):
+        self.keys = array('q')
+        self.selected = set()
+        self.offset = 0
+        self.cursor = None
+        self._render()
+
+    def selection(self):
+        return sorted(self.selected)
+
+    def yview(self, *args):
+        if args[0] == 'moveto':
+            self.scroll_to(int(float(args[1]) * len(self.keys)))
+        elif args[0] == 'scroll':
+            step = int(args[1])
+            if args[2] == 'pages':
+                step *= self.visible_count
+            self.scroll_to(self.offset + step)
+
+    def scroll_to(self, offset):
+        self.offset = max(min(offset, len(self.keys) - self.visible_count), 0)
+        self._render()
+
+    def refresh(self):
+        focus = self.tree.focus()
+        self._render()
+        if focus and self.tree.exists(focus):
+            self.tree.focus(focus)
+
+    def _render(self):
+        # Only the rows that fit in the widget exist on the Tk side, their iid
+        # is the key so a selection maps straight back to the data.
+        self.tree.delete(*self.tree.get_children())
+
+        end = min(self.offset + self.visible_count, len(self.keys))
+        shown = []
+        for position in range(self.offset, end):
+            key = self.keys[position]
+            self.tree.insert('', 'end', iid=key, values=self.formatter(key))
+            if key in self.selected:
+                shown.append(key)
+
+        self.tree.selection_set(shown)
+
+        if self.keys:
+            self.scrollbar.set(self.offset / len(self.keys), end / len(self.keys))
+        else:
+            self.scrollbar.set(0, 1)
+
+    def _visible_keys(self):
+        return set(self.keys[self.offset:self.offset + self.visible_count])
+
+    def _on_configure(self, evt):
+        rowheight = ttk.Style().lookup('Treeview', 'rowheight')
+        try:
+            rowheight = int(rowheight)
+        except (TypeError, ValueError):
+            rowheight = 20
+
+        visible_count = max((evt.height - 25) // max(rowheight, 1), 1)
+        if visible_count != self.visible_count:
+            self.visible_count = visible_count
+            self.scroll_to(self.offset)
+
+    def _on_press(self, evt):
+        # A plain click replaces the selection, including rows scrolled out of view.
+        if not evt.state & 0x0005:
+            self.selected = set()
+
+    def _on_select(self, evt):
+        self.selected -= self._visible_keys()
+        self.selected.update(int(iid) for iid in self.tree.selection())
+        # Only the visible rows exist, in the same order as keys.
+        focus = self.tree.focus()
+        if focus and self.tree.exists(focus):
+            self.cursor = self.offset + self.tree.index(focus)
+
+    def _on_mousewheel(self, evt):
+        self._scroll_units(int(-1 * (evt.delta / 120)) * 3)
+        return 'break'
+
+    def _scroll_units(self, units):
+        self.scroll_to(self.offset + units)
+        return 'break'
+
+    def _move_cursor(self, step):
+        if not self.keys:
+            return 'break'
+
+        position = self.offset if self.cursor is None else self.cursor + step
+        position = max(min(position, len(self.keys) - 1), 0)
+        self.cursor = position
+        if position < self.offset:
+            self.offset = position
+        elif position >= self.offset + self.visible_count:
+            self.offset = position - self.visible_count + 1
+
+        key = self.keys[position]
+        self.selected = {key}
+        self._render()
+        self.tree.focus(key)
+        return 'break'
+
+
 class ZoopFrame(ttk.Frame):
+    columns = (('File', 80, 50, tk.W), ('File Type', 100, 90, tk.CENTER))
+
     def __init__(self, parent,
                     default_text='No data to display yet',
                     default_image='res/Icons/add.png',
@@ -137,13 +359,10 @@ class ZoopFrame(ttk.Frame):
         self.default_cmd = default_cmd
         self.default_tooltip = default_tooltip
         self.default_deleted = False
-        self.treeview_id_count = 0
 
         self.tooltip = ZoopTooltip(self)
 
-        img_temp = Image.open(self.default_image)
-        img_temp = img_temp.resize((90, 90), Image.ANTIALIAS)
-        self.img = ImageTk.PhotoImage(img_temp)
+        self.img = load_icon(self.default_image)
 
         self.__instanciateDefault()
         self.__doBindings()
@@ -166,24 +385,14 @@ class ZoopFrame(ttk.Frame):
     def __instanciateTreeView(self):
         self.tree_frame = ttk.Frame(self)
 
-        self.treeview = ttk.Treeview(self.tree_frame)
-
         # Define our columns
-        self.treeview['columns'] = ('File', 'File Type')
-        self.treeview.column('#0', width=0, stretch=tk.NO)
-        self.treeview.column('File', width=80, minwidth=50, anchor=tk.W)
-        self.treeview.column('File Type', width=100, minwidth=90, anchor=tk.CENTER)
-
-        self.treeview.heading('#0', text='')
-        self.treeview.heading('File', text='File')
-        self.treeview.heading('File Type', text='File Type')
-
-        self.tree_scrollbar = ttk.Scrollbar(self.tree_frame, orient="vertical", command=self.treeview.yview)
-        self.treeview.configure(yscrollcommand=self.tree_scrollbar.set)
+        self.treeview = ZoopVirtualList(self.tree_frame, columns=[column[0] for column in self.columns], formatter=self.formatRow)
+        for name, width, minwidth, anchor in self.columns:
+            self.treeview.column(name, width=width, minwidth=minwidth, anchor=anchor)
+            self.treeview.heading(name, text=name)
 
     def __packTreeView(self):
-        self.treeview.pack(expand=tk.YES, fill=tk.BOTH, side=tk.LEFT)
-        self.tree_scrollbar.pack(fill=tk.Y, expand=tk.NO, side=tk.RIGHT)
+        self.treeview.pack(expand=tk.YES, fill=tk.BOTH)
 
         self.tree_frame.pack(fill=tk.BOTH, expand=tk.YES)
 
@@ -202,7 +411,6 @@ class ZoopFrame(ttk.Frame):
 
     def delete_treeview(self):
         self.treeview.destroy()
-        self.tree_scrollbar.destroy()
         self.tree_frame.destroy()
         self.__instanciateTreeView()
 
@@ -220,11 +428,10 @@ class ZoopFrame(ttk.Frame):
 
     def remove_selected(self):
         try:
-            selected_items = self.treeview.selection()        
-            for selected_item in selected_items:          
-                self.treeview.delete(selected_item)
+            selected_items = self.treeview.selection()
+            self.treeview.delete(selected_items)
 
-            if not self.treeview.get_children():
+            if not len(self.treeview):
                 self.delete_treeview()
                 self.ask_default()
 
@@ -236,7 +443,7 @@ class ZoopFrame(ttk.Frame):
     def clear_all(self):
         try:
             self.parent.master.msgbox.destroy()
-            self.treeview.delete(*self.treeview.get_children())
+            self.treeview.clear()
             self.delete_treeview()
             self.ask_default()
         except AttributeError:
@@ -246,25 +453,56 @@ class ZoopFrame(ttk.Frame):
         for sub in self.default_frame.winfo_children():
             sub.bind('<Button-1>', self.default_cmd)
 
+    def formatRow(self, key):
+        return (key,)
+
 
 class InputFrame(ZoopFrame):
+    columns = ZoopFrame.columns + (('Format', 70, 50, tk.CENTER), ('Dimensions', 90, 70, tk.CENTER), ('Mode', 50, 40, tk.CENTER),
+                                   ('Frames', 50, 40, tk.CENTER), ('Size', 70, 50, tk.CENTER))
+
     def __init__(self, parent):
         ZoopFrame.__init__(self, parent, default_text='Click here to add images', default_cmd=self.openImageFiles, default_tooltip="Click here to add image(s) to convert")
         self.parent = parent
-        self.has_input = False
-        self.paths_list = []
-        self.not_concerned_paths = []
+        self.jobs = JobTable()
+        self.task = None
+        self.watch = None
+        self.last_metrics = None
+        self.metrics_warned = False
+        self.ingest_iter = None
+        self.preview_path = None
+        self.thumbnails = ThumbnailCache(memory_budget=self.parent.master.data.get('thumbnail_cache_bytes', THUMBNAIL_MEMORY_BUDGET))
+        self.probes = ProbeCache()
+        self.probing = False
+        self.pending_batches = []
+        self.offered_batches = []
+
+        try:
+            self.store = JobStore()
+        except (OSError, sqlite3.Error) as e:
+            print('WARNING : Conversion queue unavailable, batches will not be resumed ({})'.format(e))
+            self.store = None
+        self.after_idle(self.askResume)
 
     def openImageFiles(self, evt):
         def addImageToPathsList(list_to_add, arg):
-            list_to_add.append(arg)
-            self.paths_list.append(arg)
+            list_to_add.append(self.jobs.add(arg))
 
             try:
                 self.remove_mbbox()
             except AttributeError:
                 pass
 
+        def replaceImage(arg):
+            old_id = self.jobs.lookup(arg)
+            if old_id is not None:
+                self.treeview.delete([old_id])
+                self.jobs.remove([old_id])
+
+            temp_list = []
+            addImageToPathsList(temp_list, arg)
+            self.insertRows(temp_list)
+
         try:
             filenames = askopenfilenames(title = "Select file(s)")
             
@@ -273,10 +511,10 @@ class InputFrame(ZoopFrame):
             else:
                 temp_list = []
                 for i in filenames:
-                    if os.path.splitext(i)[1] in SUPPORTED_FILES_EXT:
-                        if i in self.paths_list:
+                    if is_supported(i):
+                        if i in self.jobs:
                             msg = "{} already exists,\nDo you want to replace it ?".format(os.path.basename(i))
-                            self.mbbox = ZoopMessageBox(self, title='Zoop Alert !', msg=msg, buttons_cmds=[lambda arg=temp_list, arg2=i: addImageToPathsList(arg, i), self.remove_mbbox, self.remove_mbbox])
+                            self.mbbox = ZoopMessageBox(self, title='Zoop Alert !', msg=msg, buttons_cmds=[lambda arg=i: replaceImage(arg), self.remove_mbbox, self.remove_mbbox])
 
                         else:
                             addImageToPathsList(temp_list, i)
@@ -284,109 +522,404 @@ class InputFrame(ZoopFrame):
                 if temp_list == []:
                     print("Non supported file(s) selected")
                 else:
-
-                    if self.default_deleted == False:
-                        self.askTreeView()
-                    
-                    count = self.treeview_id_count
-                    for i in temp_list:
-                        filename, file_type = os.path.basename(i), os.path.splitext(i)[1]
-                        self.treeview.insert(parent='', iid=count, index='end', values=(filename, file_type))
-                        count += 1
-                    
-                    self.treeview_id_count = count
+                    self.insertRows(temp_list)
 
         except OSError:
             print("ERROR : An error has occured opening file(s).")
 
-    def Convert(self, mode='all'):
-        to_convert = self.getToConvert(mode)
-        success = 0
-        aborted = 0
-        try:
+    def insertRows(self, job_ids):
+        if self.default_deleted == False:
+            self.askTreeView()
+
+        self.treeview.append(job_ids)
+
+        self.probes.request(self.jobs.path(job_id) for job_id in job_ids)
+        if not self.probing:
+            self.probing = True
+            self.after(PROBE_POLL_MS, self.pollProbes)
+
+    def formatRow(self, key):
+        path = self.jobs.path(key)
+        row = (os.path.basename(path), os.path.splitext(path)[1])
+
+        info = self.probes.lookup(path)
+        if info is None:
+            return row + ('...',) * 5
+        if info.error is not None:
+            return row + ('Unreadable', '', '', '', format_bytes(info.file_size))
+
+        real_format = info.format + (' (!)' if info.is_mislabeled(path) else '')
+        return row + (real_format, '{}x{}'.format(*info.size), info.mode, info.frames, format_bytes(info.file_size))
+
+    def pollProbes(self):
+        # Headers are read by the probe threads, Tk only redraws the visible
+        # rows once some of them are done and reports mislabeled files.
+        logview = self.parent.master.optionsFrame.logview
+        completed = self.probes.drain()
+        for path, info in completed:
+            if info.error is not None:
+                logview.log(color='red', msg="ERROR : Cannot read " + path + " (" + info.error + ")")
+            elif info.is_mislabeled(path):
+                logview.log(color='orange', msg="WARNING : " + path + " is actually a " + info.format + " file")
+            if info.warning is not None:
+                logview.log(color='orange', msg="WARNING : " + path + " : " + info.warning)
+
+        if completed and self.default_deleted:
+            self.treeview.refresh()
+
+        if self.probes.pending or completed:
+            self.after(PROBE_POLL_MS, self.pollProbes)
+        else:
+            self.probing = False
 
-            for img in to_convert:
-                try:
-                    saved_image = Image.open(img)
+    def askTreeView(self):
+        ZoopFrame.askTreeView(self)
+
+        self.preview_label = ttk.Label(self.tree_frame, text='Select an image to preview it', anchor=tk.CENTER, compound=tk.TOP)
+        self.preview_label.pack(side=tk.BOTTOM, fill=tk.X, pady=5, before=self.treeview)
+        self.treeview.tree.bind('<<TreeviewSelect>>', self.showPreview, add='+')
+
+    def showPreview(self, evt=None):
+        focus = self.treeview.tree.focus()
+        if focus:
+            self.preview_path = self.jobs.path(int(focus))
+            self.pollPreview(self.preview_path)
+
+    def pollPreview(self, path):
+        # Thumbnails are generated by the cache's worker threads, Tk only
+        # ever touches them from here.
+        if path != self.preview_path or not self.preview_label.winfo_exists():
+            return
+
+        image = self.thumbnails.lookup(path)
+        if image is not None:
+            from PIL import ImageTk
+
+            self.preview_img = ImageTk.PhotoImage(image)
+            self.preview_label.config(image=self.preview_img, text=os.path.basename(path))
+        elif self.thumbnails.error(path):
+            self.preview_label.config(image='', text='No preview available')
+        else:
+            self.preview_label.config(image='', text='Loading preview...')
+            self.after(PREVIEW_POLL_MS, self.pollPreview, path)
+
+    def openImageFolder(self, evt=None):
+        directory = askdirectory(title='Select a folder of images')
+        if directory:
+            self.ingestPaths(iter_directory(directory))
+
+    def ingestPaths(self, paths):
+        # Paths are pulled from the generator a chunk per Tk tick so the
+        # window keeps redrawing while big folders are being walked.
+        if self.ingest_iter is None:
+            self.ingest_iter = iter(paths)
+            self.after_idle(self.ingestChunk)
+        else:
+            self.ingest_iter = itertools.chain(self.ingest_iter, paths)
+
+    def ingestChunk(self):
+        if self.ingest_iter is None:
+            return
+
+        chunk = []
+        read = 0
+        for path in itertools.islice(self.ingest_iter, INGEST_CHUNK_SIZE):
+            read += 1
+            job_id = self.jobs.add(path)
+            if job_id is not None:
+                chunk.append(job_id)
+
+        if chunk:
+            self.insertRows(chunk)
+
+        logview_state = self.parent.master.optionsFrame.logview.logview_state
+        if read < INGEST_CHUNK_SIZE:
+            self.ingest_iter = None
+            if not self.isConverting():
+                logview_state.set('No conversion started')
+        else:
+            if not self.isConverting():
+                logview_state.set('Adding files... ({})'.format(len(self.jobs)))
+            self.after(1, self.ingestChunk)
 
-                    img_filename = '/' + os.path.basename(img).split('.')[0]
-                    save_ext = self.parent.master.optionsFrame.outputFileFormat.get()
-                    save_dir = self.parent.master.optionsFrame.outputDir.get()
+    def Convert(self, mode='all'):
+        to_convert = self.getToConvert(mode)
 
-                    save_path = os.path.join(save_dir + img_filename + save_ext)
-                    
-                    try:
-                        self.parent.master.optionsFrame.logview.log(color='green', msg="INFO : Converting " + img + " to " + save_ext +  " ...")
-                        saved_image.save(save_path)
-                        success += 1
-                    except:
-                        self.parent.master.optionsFrame.logview.log(color='red', msg="ERROR : Failed to convert " + img + " to " + save_ext)
-                        aborted += 1
+        options = self.parent.master.optionsFrame
+        save_ext = options.outputFileFormat.get()
+        save_dir = options.outputDir.get()
 
-                except:
-                    pass
+        try:
+            job_options = options.getJobOptions()
+        except ValueError as e:
+            options.logview.log(color='red', msg="ERROR : " + str(e))
+            options.logview.logview_state.set('No conversion started')
+            return
+
+        mirror = options.mirrorTree.get()
+        jobs = make_jobs(to_convert, save_dir, save_ext, job_options, root=source_root(to_convert) if mirror else None)
+        settings = {'output_dir': save_dir, 'output_ext': save_ext, 'incremental': options.incremental.get(), 'dedup': options.dedup.get(),
+                    'mirror': mirror}
+        self.startTask(jobs, settings)
+
+    def startTask(self, jobs, settings, batch=None):
+        options = self.parent.master.optionsFrame
+        manifest = Manifest(settings['output_dir']) if settings['incremental'] else None
+        self.task = ConversionTask(jobs, workers=options.getWorkers(), manifest=manifest, metrics=self.openMetrics(),
+                                   memory_budget=options.getMemoryBudget(), dedup=Deduplicator('link', options.fsyncPolicy.get()) if settings['dedup'] else None,
+                                   probes=self.probes, store=self.store, batch=batch, settings=settings,
+                                   io_workers=self.parent.master.data.get('io_workers', DEFAULT_IO_WORKERS), fsync=options.fsyncPolicy.get(),
+                                   by_directory=settings.get('mirror', False))
+        self.parent.master.toolbar.showProgress(self.task.progress)
+        self.task.start()
+        self.after(CONVERSION_POLL_MS, self.pollConversion)
+
+    def openMetrics(self):
+        # Without a writable logs folder the batch still runs, its metrics
+        # are then only kept in memory for the metrics window.
+        try:
+            sink = MetricsSink(default_metrics_path())
+        except OSError as e:
+            if not self.metrics_warned:
+                self.metrics_warned = True
+                self.parent.master.optionsFrame.logview.log(color='orange', msg="WARNING : Metrics file unavailable, timings are not saved ({})".format(e))
+            return None
+        prune_metrics()
+        return sink
+
+    def askResume(self):
+        # Batches left in the queue were cut short by a crash or by closing
+        # the window, their remaining jobs can be converted right away.
+        if self.store is None or self.isConverting():
+            return
+
+        counts = self.store.pending_counts()
+        if not counts:
+            return
+
+        # The box is not modal: only the ids are kept here, the batches are
+        # loaded once the user picks Resume.
+        self.offered_batches = list(counts)
+        count = sum(counts.values())
+        msg = "{} file(s) from an unfinished conversion\nare still waiting, resume them ?".format(count)
+        self.mbbox = ZoopMessageBox(self, title='Zoop Alert !', msg=msg, buttons=['Resume', 'Discard'],
+                                    buttons_cmds=[self.resumePending, self.discardPending], image='res/Icons/info.png')
+
+    def resumePending(self):
+        if self.isConverting():
+            self.parent.master.optionsFrame.logview.log(color='orange', msg="WARNING : Wait for the current conversion to finish before resuming")
+            return
+
+        self.remove_mbbox()
+        self.pending_batches = self.store.pending_batches(self.offered_batches)
+        self.offered_batches = []
+        if self.pending_batches:
+            self.resumeNext()
+
+    def resumeNext(self):
+        if not self.pending_batches:
+            return
+        batch = self.pending_batches.pop(0)
+        self.parent.master.optionsFrame.logview.log(color='cyan', msg="INFO : Resuming {} file(s) to {}".format(len(batch.jobs), batch.settings['output_dir']))
+        self.startTask(batch.jobs, batch.settings, batch=batch.id)
+
+    def discardPending(self):
+        self.remove_mbbox()
+        for batch_id in self.offered_batches:
+            self.store.finish_batch(batch_id)
+        self.offered_batches = []
+
+    def isConverting(self):
+        return self.task is not None
+
+    def watchFolder(self):
+        # Runs next to regular conversions with its own worker pool, the
+        # current output settings are used for every file that arrives.
+        options = self.parent.master.optionsFrame
+        if self.watch is not None:
+            options.logview.log(color='orange', msg="WARNING : Already watching " + self.watch.directory)
+            return
+
+        directory = askdirectory(title='Select a folder to watch')
+        if not directory:
+            return
 
-        except AttributeError as e:
-            pass
+        try:
+            job_options = options.getJobOptions()
+        except ValueError as e:
+            options.logview.log(color='red', msg="ERROR : " + str(e))
+            return
+
+        save_dir = os.path.abspath(options.outputDir.get())
+        os.makedirs(save_dir, exist_ok=True)
+        self.watch = WatchTask(os.path.abspath(directory), save_dir, options.outputFileFormat.get(), job_options,
+                               workers=options.getWorkers(), memory_budget=options.getMemoryBudget(),
+                               metrics=self.openMetrics(),
+                               io_workers=self.parent.master.data.get('io_workers', DEFAULT_IO_WORKERS), fsync=options.fsyncPolicy.get(),
+                               mirror=options.mirrorTree.get())
+        self.watch.start()
+        self.after(CONVERSION_POLL_MS, self.pollWatch)
+
+    def stopWatching(self):
+        if self.watch is not None:
+            self.watch.cancel()
+
+    def pollWatch(self):
+        logview = self.parent.master.optionsFrame.logview
+        save_ext = self.watch.output_ext
+        finished = False
+
+        for kind, payload in self.watch.drain():
+            if kind == 'result':
+                if payload.ok:
+                    logview.log(color='green', msg="INFO : Converted " + payload.source + " to " + save_ext)
+                else:
+                    logview.log(color='red', msg="ERROR : Failed to convert " + payload.source + " to " + save_ext + " (" + payload.error + ")")
+            elif kind == 'stats':
+                if not self.isConverting():
+                    logview.logview_state.set('Watching : {} converted, {} queued, {:.2f} file(s)/s'.format(
+                        payload['success'], payload['queue_depth'], payload['throughput']))
+            elif kind == 'watching':
+                logview.log(color='cyan', msg="INFO : Watching " + self.watch.directory + " for new images")
+            elif kind == 'renamed':
+                for source, target, new_target in payload:
+                    logview.log(color='orange', msg="WARNING : " + source + " would overwrite " + target + ", saved as " + new_target)
+            elif kind == 'error':
+                logview.log(color='red', msg="ERROR : Watching stopped : " + str(payload))
+            elif kind == 'finished':
+                finished = True
+
+        if finished:
+            logview.log(color='cyan', msg="INFO : Stopped watching " + self.watch.directory)
+            self.watch = None
+            if not self.isConverting():
+                logview.logview_state.set('No conversion started')
+        else:
+            self.after(CONVERSION_POLL_MS, self.pollWatch)
+
+    def cancelConversion(self, keep_queue=False):
+        if self.task is not None:
+            self.task.cancel(keep_queue)
+            self.parent.master.optionsFrame.logview.logview_state.set('Cancelling...')
+
+    def pollConversion(self):
+        options = self.parent.master.optionsFrame
+        save_ext = self.task.settings['output_ext']
+        finished = False
+
+        for kind, payload in self.task.drain():
+            if kind == 'result':
+                if payload.ok:
+                    if payload.attempts:
+                        options.logview.log(color='green', msg="INFO : Converted {} to {} (quality {}, {} attempt(s))".format(
+                            payload.source, save_ext, payload.quality, payload.attempts))
+                    else:
+                        options.logview.log(color='green', msg="INFO : Converted " + payload.source + " to " + save_ext)
+                    for warning in payload.warnings:
+                        options.logview.log(color='orange', msg="WARNING : " + payload.source + " : " + warning)
+                else:
+                    options.logview.log(color='red', msg="ERROR : Failed to convert " + payload.source + " to " + save_ext + " (" + payload.error + ")")
+            elif kind == 'renamed':
+                for source, target, new_target in payload:
+                    options.logview.log(color='orange', msg="WARNING : " + source + " would overwrite " + target + ", saved as " + new_target)
+            elif kind == 'preparing':
+                stage, done, total = payload
+                options.logview.logview_state.set('{} files... ({}/{})'.format('Hashing' if stage == 'hash' else 'Reading', done, total))
+            elif kind == 'duplicates':
+                options.logview.log(color='cyan', msg="INFO : {} identical file(s) will be linked instead of converted again".format(payload))
+            elif kind == 'skipped':
+                options.logview.log(color='cyan', msg="INFO : {} file(s) already up to date, skipped".format(len(payload)))
+            elif kind == 'error':
+                options.logview.log(color='red', msg="ERROR : Conversion stopped : " + str(payload))
+            elif kind == 'finished':
+                finished = True
+
+        self.parent.master.toolbar.showProgress(self.task.progress)
+
+        if finished:
+            self.conversionFinished()
+        else:
+            self.after(CONVERSION_POLL_MS, self.pollConversion)
+
+    def conversionFinished(self):
+        progress = self.task.progress
+        self.last_metrics = self.task.summary
+        self.task = None
 
         self.parent.master.optionsFrame.logview.logview_state.set('No conversion started')
+        self.parent.master.toolbar.resetProgress()
 
-        if success or aborted != 0:
+        if self.pending_batches and not progress.cancelled:
+            self.resumeNext()
+            return
+
+        if progress.done or progress.cancelled:
             msg = """
 Conversion report :
 {} file(s) converted successfully.
 {} file(s) aborted.
-            """.format(success, aborted)
+{} file(s) skipped (up to date).
+{} file(s) cancelled.
+            """.format(progress.success, progress.aborted, progress.skipped, progress.cancelled)
+
+            self.mbbox = ZoopMessageBox(self, title="Conversion report", msg=msg, buttons=['Metrics', 'Ok'], buttons_cmds=[self.showMetrics, self.remove_mbbox], image='res/Icons/info.png')
+
+    def showMetrics(self):
+        try:
+            self.remove_mbbox()
+        except (AttributeError, tk.TclError):
+            pass
 
-            self.mbbox = ZoopMessageBox(self, title="Conversion report", msg=msg, buttons=['Ok'], buttons_cmds=[self.remove_mbbox], image='res/Icons/info.png')
+        if self.last_metrics is not None:
+            ZoopMetricsWindow(self, self.last_metrics)
 
     def remove_mbbox(self):
         self.mbbox.destroy()
 
     def getToConvert(self, mode):
-        to_convert = self.paths_list[:]
-
-        for i in range(len(self.paths_list)):
-            for n in self.not_concerned_paths:
-                if i == int(n):
-                    print('Deleted file :', self.paths_list[int(n)])
-                    to_convert.pop(i)
-
         if mode == 'selected':
-            temp = []
-            for i in range(len(to_convert)):
-                for n in self.treeview.selection():
-                    if i == int(n):
-                        temp.append(to_convert[i])
-
-            to_convert = temp
+            try:
+                return self.jobs.select(self.treeview.selection())
+            except AttributeError:
+                return []
 
-        return to_convert
+        return self.jobs.live_paths()
 
 
 class ZoopLogView(ttk.Frame):
-    def __init__(self, parent):
+    def __init__(self, parent, capacity=LOG_CAPACITY):
         ttk.Frame.__init__(self, parent)
         self.parent = parent
-        self.logs_list = []
+        try:
+            logger = file_logger()
+        except OSError as e:
+            print('WARNING : Log file unavailable, messages are only shown in the window ({})'.format(e))
+            logger = None
+        self.buffer = LogBuffer(capacity, logger=logger)
         self.log_x = 5
         self.log_y = 12
         self.scroll_region_x = 0
-        self.scroll_region_y = 30
+        self.first_line = 0
+        self.visible_lines = 1
+        self.follow = True
+        self.flush_pending = False
+        self.text_items = []
+        self.font = tkfont.nametofont('TkDefaultFont')
+        self.line_height = self.font.metrics('linespace') + 2
         self.logview_state = tk.StringVar()
         self.logview_state.set('No conversion started')
 
         logview_bg = ttk.Style().lookup('TFrame', 'background')
 
         self.logviewframe = ttk.Frame(self)
-        self.logviewcanvas = tk.Canvas(self.logviewframe, scrollregion=(0, 0, self.scroll_region_x, self.scroll_region_y), bg=logview_bg, highlightbackground=logview_bg)
+        self.logviewcanvas = tk.Canvas(self.logviewframe, scrollregion=(0, 0, 0, 0), bg=logview_bg, highlightbackground=logview_bg)
         self.logviewcanvas.pack(fill=tk.BOTH, expand=tk.YES, side=tk.LEFT)
 
         self.logview_scrollbar = ttk.Scrollbar(self.logviewframe)
         self.logviewcanvas.bind('<Enter>', self._bound_to_mousewheel)
         self.logviewcanvas.bind('<Leave>', self._unbound_to_mousewheel)
-        self.logview_scrollbar.config(command=self.logviewcanvas.yview)
-        self.logviewcanvas.config(yscrollcommand=self.logview_scrollbar.set)
+        self.logviewcanvas.bind('<Configure>', lambda evt: self._schedule_flush())
+        self.logview_scrollbar.config(command=self._yview)
 
         self.logview_scrollbar2 = ttk.Scrollbar(self, orient='horizontal')
         self.logview_scrollbar2.config(command=self.logviewcanvas.xview)
@@ -414,25 +947,62 @@ class ZoopLogView(ttk.Frame):
         self.logviewcanvas.unbind_all("<MouseWheel>")
 
     def _on_mousewheel(self, event):
-        self.logviewcanvas.yview("scroll",int(-1*(event.delta/120)),"units")
+        self._scroll_to(self.first_line + int(-1*(event.delta/120)) * 3)
+
+    def _yview(self, *args):
+        if args[0] == 'moveto':
+            self._scroll_to(int(float(args[1]) * len(self.buffer)))
+        elif args[0] == 'scroll':
+            step = int(args[1])
+            if args[2] == 'pages':
+                step *= self.visible_lines
+            self._scroll_to(self.first_line + step)
+
+    def _scroll_to(self, line):
+        last_page = max(len(self.buffer) - self.visible_lines, 0)
+        self.first_line = max(min(line, last_page), 0)
+        self.follow = self.first_line >= last_page
+        self._render()
 
     def log(self, header='', msg='', color='black', infos=None):
-        self.logs_list.append([msg, color, infos])
-
-        text = self.logviewcanvas.create_text(self.log_x, self.log_y, text=header + msg, fill=color, justify='left', anchor='w')
-
-        bounds = self.logviewcanvas.bbox(text)
-        width = bounds[2] - bounds[0]
-        height = bounds[3] - bounds[1]
-
-        self.log_y += height + 2
-        self.scroll_region_y += height + 2
-
-        if width > self.scroll_region_x:
-            self.scroll_region_x = width
+        self.buffer.append(header + msg, color)
+        self._schedule_flush()
+
+    def _schedule_flush(self):
+        # Messages coming in between two ticks are drawn with a single redraw.
+        if not self.flush_pending:
+            self.flush_pending = True
+            self.after(LOG_FLUSH_MS, self._render)
+
+    def _render(self):
+        self.flush_pending = False
+        lines = len(self.buffer)
+        self.visible_lines = max((self.logviewcanvas.winfo_height() - self.log_y) // self.line_height + 1, 1)
+
+        last_page = max(lines - self.visible_lines, 0)
+        if self.follow:
+            self.first_line = last_page
+        self.first_line = min(self.first_line, last_page)
+
+        # Only one canvas text item per visible line, reused on every redraw.
+        while len(self.text_items) < self.visible_lines:
+            y = self.log_y + len(self.text_items) * self.line_height
+            self.text_items.append(self.logviewcanvas.create_text(self.log_x, y, text='', justify='left', anchor='w', font=self.font))
+
+        for row, item in enumerate(self.text_items):
+            index = self.first_line + row
+            if row < self.visible_lines and index < lines:
+                text, color = self.buffer[index]
+                self.logviewcanvas.itemconfigure(item, text=text, fill=color)
+                self.scroll_region_x = max(self.scroll_region_x, self.font.measure(text))
+            else:
+                self.logviewcanvas.itemconfigure(item, text='')
 
-        self.logviewcanvas.config(scrollregion=(0,0,self.scroll_region_x + self.log_x, self.scroll_region_y))
-        self.logviewcanvas.yview("moveto", 10)
+        self.logviewcanvas.config(scrollregion=(0, 0, self.scroll_region_x + self.log_x, self.visible_lines * self.line_height))
+        if lines:
+            self.logview_scrollbar.set(self.first_line / lines, min(self.first_line + self.visible_lines, lines) / lines)
+        else:
+            self.logview_scrollbar.set(0, 1)
 
 
 class ConversionOptionsFrame(ttk.LabelFrame):
@@ -441,6 +1011,23 @@ class ConversionOptionsFrame(ttk.LabelFrame):
         self.parent = parent
         self.outputFileFormat = tk.StringVar()
         self.outputDir = tk.StringVar()
+        self.workers = tk.IntVar()
+        self.incremental = tk.BooleanVar()
+        self.dedup = tk.BooleanVar()
+        self.mirrorTree = tk.BooleanVar()
+        self.encodingProfile = tk.StringVar()
+        self.targetSize = tk.StringVar()
+        self.resizeMode = tk.StringVar()
+        self.resizeValue = tk.StringVar()
+        self.resizeFilter = tk.StringVar()
+        self.frameMode = tk.StringVar()
+        self.memoryBudget = tk.IntVar()
+        self.bombPolicy = tk.StringVar()
+        self.fsyncPolicy = tk.StringVar()
+        self.background = tk.StringVar()
+        self.iccPolicy = tk.StringVar()
+        self.sameFormat = tk.StringVar()
+        self.metadataPolicy = tk.StringVar()
 
         self.pack(side=tk.RIGHT, fill=tk.BOTH, expand=tk.NO)
 
@@ -454,6 +1041,44 @@ class ConversionOptionsFrame(ttk.LabelFrame):
         self.outputCombo.pack(side=tk.RIGHT, padx=5)
         self.outputFileFormatFrame.pack(side=tk.TOP, fill=tk.X, pady=15)
 
+        self.profileFrame = ttk.Frame(self)
+        self.profileLabel = ttk.Label(self.profileFrame, text='Encoding profile :')
+        self.profileCombo = ttk.Combobox(self.profileFrame, values=PROFILE_NAMES, textvariable=self.encodingProfile, state='readonly')
+        self.loadEncodingProfile()
+
+        self.outputFileFormat.trace_add('write', lambda *args: self.loadEncodingProfile())
+        self.profileCombo.bind('<<ComboboxSelected>>', self.saveEncodingProfile)
+
+        self.profileLabel.pack(side=tk.LEFT, padx=8)
+        self.profileCombo.pack(side=tk.RIGHT, padx=5)
+        self.profileFrame.pack(side=tk.TOP, fill=tk.X, pady=(0, 15))
+
+        self.targetSizeFrame = ttk.Frame(self)
+        self.targetSizeLabel = ttk.Label(self.targetSizeFrame, text='Target size (KB) :')
+        self.targetSizeEntry = ttk.Entry(self.targetSizeFrame, textvariable=self.targetSize, width=10)
+
+        self.targetSizeLabel.pack(side=tk.LEFT, padx=8)
+        self.targetSizeEntry.pack(side=tk.RIGHT, padx=5)
+        self.targetSizeFrame.pack(side=tk.TOP, fill=tk.X, pady=(0, 15))
+
+        self.resizeFrame = ttk.Frame(self)
+        self.resizeLabel = ttk.Label(self.resizeFrame, text='Resize :')
+        self.resizeFilterCombo = ttk.Combobox(self.resizeFrame, values=sorted(RESAMPLING_FILTERS), textvariable=self.resizeFilter, state='readonly', width=8)
+        self.resizeValueEntry = ttk.Entry(self.resizeFrame, textvariable=self.resizeValue, width=10)
+        self.resizeModeCombo = ttk.Combobox(self.resizeFrame, values=RESIZE_MODES, textvariable=self.resizeMode, state='readonly', width=6)
+        self.resizeMode.set('none')
+        self.resizeFilter.set(DEFAULT_FILTER)
+
+        self.tooltip = ZoopTooltip(self)
+        self.tooltip.assignTooltip(self.targetSizeEntry, msg="JPEG and WebP only : the quality is lowered until every output fits in this many KB.\nLeave empty to use the profile quality.")
+        self.tooltip.assignTooltip(self.resizeValueEntry, msg="max : longest side in pixels (2048)\nexact : width x height (800x600)\nscale : factor (0.5)")
+
+        self.resizeLabel.pack(side=tk.LEFT, padx=8)
+        self.resizeFilterCombo.pack(side=tk.RIGHT, padx=5)
+        self.resizeValueEntry.pack(side=tk.RIGHT)
+        self.resizeModeCombo.pack(side=tk.RIGHT, padx=5)
+        self.resizeFrame.pack(side=tk.TOP, fill=tk.X, pady=(0, 15))
+
         self.outputDirFrame = ttk.Frame(self)
         self.outputDirLabel = ttk.Label(self.outputDirFrame, text='Output Directory :')
 
@@ -469,14 +1094,232 @@ class ConversionOptionsFrame(ttk.LabelFrame):
         self.outputDirEntryFrame.pack(side=tk.RIGHT, padx=5)
         self.outputDirFrame.pack(side=tk.TOP, fill=tk.X)
 
-        self.logview = ZoopLogView(self)
+        # Everything but the format, size and output folder is tucked away
+        # so the default layout fits the window.
+        self.advancedButton = ttk.Button(self, command=self.toggleAdvanced)
+        self.advancedButton.pack(side=tk.TOP, anchor='w', padx=5, pady=(15, 0))
+        self.advancedFrame = ttk.Frame(self)
+
+        self.framesFrame = ttk.Frame(self.advancedFrame)
+        self.framesLabel = ttk.Label(self.framesFrame, text='Animated images :')
+        self.framesCombo = ttk.Combobox(self.framesFrame, values=FRAME_MODES, textvariable=self.frameMode, state='readonly', width=8)
+        self.frameMode.set(DEFAULT_FRAME_MODE)
+        self.tooltip.assignTooltip(self.framesCombo, msg="animate : keep the animation when the output format supports it\nfirst : keep the first frame only\nextract : save every frame (or icon size) as its own file")
+
+        self.framesLabel.pack(side=tk.LEFT, padx=8)
+        self.framesCombo.pack(side=tk.RIGHT, padx=5)
+        self.framesFrame.pack(side=tk.TOP, fill=tk.X, pady=(8, 0))
+
+        self.sameFormatFrame = ttk.Frame(self.advancedFrame)
+        self.sameFormatLabel = ttk.Label(self.sameFormatFrame, text='Same format :')
+        self.sameFormatCombo = ttk.Combobox(self.sameFormatFrame, values=SAME_FORMAT_MODES, textvariable=self.sameFormat, state='readonly', width=8)
+        self.sameFormat.set(DEFAULT_SAME_FORMAT)
+        self.tooltip.assignTooltip(self.sameFormatCombo, msg="Sources already in the output format that need no resize or colour change :\ncopy : copy the file as is\nlink : hard-link it (shares the file on disk)\nreencode : decode and encode it again")
+
+        self.sameFormatLabel.pack(side=tk.LEFT, padx=8)
+        self.sameFormatCombo.pack(side=tk.RIGHT, padx=5)
+        self.sameFormatFrame.pack(side=tk.TOP, fill=tk.X, pady=(8, 0))
+
+        self.metadataFrame = ttk.Frame(self.advancedFrame)
+        self.metadataLabel = ttk.Label(self.metadataFrame, text='Metadata :')
+        self.metadataCombo = ttk.Combobox(self.metadataFrame, values=METADATA_POLICIES, textvariable=self.metadataPolicy, state='readonly', width=8)
+        self.metadataPolicy.set(DEFAULT_METADATA)
+        self.tooltip.assignTooltip(self.metadataCombo, msg="strip : drop EXIF, XMP and comments from JPEG sources copied to JPEG,\nwithout re-encoding and keeping the orientation.\nRe-encoded outputs never keep them.")
+
+        self.metadataLabel.pack(side=tk.LEFT, padx=8)
+        self.metadataCombo.pack(side=tk.RIGHT, padx=5)
+        self.metadataFrame.pack(side=tk.TOP, fill=tk.X, pady=(8, 0))
+
+        self.workersFrame = ttk.Frame(self.advancedFrame)
+        self.workersLabel = ttk.Label(self.workersFrame, text='Worker processes :')
+        self.workersSpinbox = ttk.Spinbox(self.workersFrame, from_=1, to=max(default_workers() * 2, 1), width=5, textvariable=self.workers)
+        self.workers.set(default_workers())
+
+        self.workersLabel.pack(side=tk.LEFT, padx=8)
+        self.workersSpinbox.pack(side=tk.RIGHT, padx=5)
+        self.workersFrame.pack(side=tk.TOP, fill=tk.X, pady=(8, 0))
+
+        self.memoryFrame = ttk.Frame(self.advancedFrame)
+        self.memoryLabel = ttk.Label(self.memoryFrame, text='Memory budget (MB) :')
+        self.memorySpinbox = ttk.Spinbox(self.memoryFrame, from_=0, to=1024 * 1024, increment=256, width=7, textvariable=self.memoryBudget)
+        self.memoryBudget.set((default_memory_budget() or 0) // (1024 * 1024))
+        self.tooltip.assignTooltip(self.memorySpinbox, msg="Jobs are started only while their estimated decoded size fits in this budget.\nA bigger image runs alone and is still decoded in full,\nonly its output is streamed to disk.\n0 disables the limit.")
+
+        self.memoryLabel.pack(side=tk.LEFT, padx=8)
+        self.memorySpinbox.pack(side=tk.RIGHT, padx=5)
+        self.memoryFrame.pack(side=tk.TOP, fill=tk.X, pady=(8, 0))
+
+        self.bombFrame = ttk.Frame(self.advancedFrame)
+        self.bombLabel = ttk.Label(self.bombFrame, text='Huge images :')
+        self.bombCombo = ttk.Combobox(self.bombFrame, values=BOMB_POLICIES, textvariable=self.bombPolicy, state='readonly', width=8)
+        self.bombPolicy.set(DEFAULT_BOMB_POLICY)
+        self.tooltip.assignTooltip(self.bombCombo, msg="error : refuse images over Pillow's decompression bomb limit\nwarn : convert them but log a warning\noff : no limit")
+
+        self.bombLabel.pack(side=tk.LEFT, padx=8)
+        self.bombCombo.pack(side=tk.RIGHT, padx=5)
+        self.bombFrame.pack(side=tk.TOP, fill=tk.X, pady=(8, 0))
+
+        self.backgroundFrame = ttk.Frame(self.advancedFrame)
+        self.backgroundLabel = ttk.Label(self.backgroundFrame, text='Background :')
+        self.backgroundEntry = ttk.Entry(self.backgroundFrame, textvariable=self.background, width=9)
+        self.background.set(DEFAULT_BACKGROUND)
+        self.tooltip.assignTooltip(self.backgroundEntry, msg="Colour transparent images are flattened on for formats without alpha (JPEG, BMP).\nA name or #rrggbb.")
+
+        self.backgroundLabel.pack(side=tk.LEFT, padx=8)
+        self.backgroundEntry.pack(side=tk.RIGHT, padx=5)
+        self.backgroundFrame.pack(side=tk.TOP, fill=tk.X, pady=(8, 0))
+
+        self.iccFrame = ttk.Frame(self.advancedFrame)
+        self.iccLabel = ttk.Label(self.iccFrame, text='Colour profile :')
+        self.iccCombo = ttk.Combobox(self.iccFrame, values=ICC_POLICIES, textvariable=self.iccPolicy, state='readonly', width=8)
+        self.iccPolicy.set(DEFAULT_ICC_POLICY)
+        self.tooltip.assignTooltip(self.iccCombo, msg="keep : embed the source ICC profile in the output\nsrgb : convert the colours to sRGB\nstrip : drop the profile")
+
+        self.iccLabel.pack(side=tk.LEFT, padx=8)
+        self.iccCombo.pack(side=tk.RIGHT, padx=5)
+        self.iccFrame.pack(side=tk.TOP, fill=tk.X, pady=(8, 0))
+
+        self.fsyncFrame = ttk.Frame(self.advancedFrame)
+        self.fsyncLabel = ttk.Label(self.fsyncFrame, text='Disk sync :')
+        self.fsyncCombo = ttk.Combobox(self.fsyncFrame, values=FSYNC_POLICIES, textvariable=self.fsyncPolicy, state='readonly', width=8)
+        self.fsyncPolicy.set(self.parent.master.data.get('fsync', DEFAULT_FSYNC))
+        self.fsyncCombo.bind('<<ComboboxSelected>>', self.saveFsyncPolicy)
+        self.tooltip.assignTooltip(self.fsyncCombo, msg="never : let the system flush outputs (fastest)\nfile : flush every output before renaming it\nfull : also flush the folder after the rename")
+
+        self.fsyncLabel.pack(side=tk.LEFT, padx=8)
+        self.fsyncCombo.pack(side=tk.RIGHT, padx=5)
+        self.fsyncFrame.pack(side=tk.TOP, fill=tk.X, pady=(8, 0))
+
+        self.incrementalCheck = ttk.Checkbutton(self.advancedFrame, text='Skip up-to-date outputs', variable=self.incremental)
+        self.incrementalCheck.pack(side=tk.TOP, anchor='w', padx=8, pady=(12, 0))
+
+        self.dedupCheck = ttk.Checkbutton(self.advancedFrame, text='Convert identical files only once', variable=self.dedup)
+        self.tooltip.assignTooltip(self.dedupCheck, msg="Byte-identical images are converted once and hard-linked to their other output names.")
+        self.dedupCheck.pack(side=tk.TOP, anchor='w', padx=8, pady=(5, 0))
+
+        self.mirrorCheck = ttk.Checkbutton(self.advancedFrame, text='Keep folder structure', variable=self.mirrorTree)
+        self.tooltip.assignTooltip(self.mirrorCheck, msg="Outputs keep their folders relative to the deepest folder all the inputs share,\ninstead of all being written into the output directory.")
+        self.mirrorCheck.pack(side=tk.TOP, anchor='w', padx=8, pady=(5, 0))
+
+        self.logview = ZoopLogView(self, capacity=self.parent.master.data.get('log_capacity', LOG_CAPACITY))
         self.logview.pack(fill=tk.BOTH, expand=tk.YES, padx=10, pady=(20, 5))
 
+        self.showAdvanced(self.parent.master.data.get('advanced_options', False))
+
     def setOutputDir(self):
         directory = askdirectory(title='Select conversion output directory')
         if directory != '':
             self.outputDir.set(directory)
 
+    def getEncodingProfiles(self):
+        return self.parent.master.data.setdefault('encoding_profiles', {})
+
+    def loadEncodingProfile(self):
+        format_name = format_for_ext(self.outputFileFormat.get())
+        self.encodingProfile.set(self.getEncodingProfiles().get(format_name, DEFAULT_PROFILE))
+
+    def saveEncodingProfile(self, evt=None):
+        format_name = format_for_ext(self.outputFileFormat.get())
+        if format_name is not None:
+            self.getEncodingProfiles()[format_name] = self.encodingProfile.get()
+            self.parent.master.save_preferences()
+
+    def showAdvanced(self, shown):
+        self.advancedShown = shown
+        if shown:
+            self.advancedFrame.pack(side=tk.TOP, fill=tk.X, before=self.logview)
+        else:
+            self.advancedFrame.pack_forget()
+        self.advancedButton.config(text=('▾' if shown else '▸') + ' Advanced options')
+
+    def toggleAdvanced(self):
+        shown = not self.advancedShown
+        self.showAdvanced(shown)
+        self.parent.master.data['advanced_options'] = shown
+        self.parent.master.save_preferences()
+
+    def saveFsyncPolicy(self, evt=None):
+        self.parent.master.data['fsync'] = self.fsyncPolicy.get()
+        self.parent.master.save_preferences()
+
+    def getJobOptions(self):
+        job_options = {
+            'save': save_options(self.outputFileFormat.get(), self.encodingProfile.get()),
+            'frames': self.frameMode.get(),
+            'bomb_policy': self.bombPolicy.get(),
+            'background': parse_background(self.background.get()),
+            'icc': self.iccPolicy.get(),
+            'same_format': self.sameFormat.get(),
+            'metadata': self.metadataPolicy.get(),
+        }
+
+        resize = parse_resize(self.resizeMode.get(), self.resizeValue.get(), self.resizeFilter.get())
+        if resize is not None:
+            job_options['resize'] = resize
+
+        target_size = parse_target_size(self.targetSize.get())
+        if target_size is not None:
+            if format_for_ext(self.outputFileFormat.get()) not in TARGET_SIZE_FORMATS:
+                raise ValueError('a target size needs a JPEG or WebP output format')
+            job_options['target_size'] = target_size
+
+        return job_options
+
+    def getMemoryBudget(self):
+        try:
+            return max(int(self.memoryBudget.get()), 0) * 1024 * 1024 or None
+        except (tk.TclError, ValueError):
+            return default_memory_budget()
+
+    def getWorkers(self):
+        try:
+            return max(int(self.workers.get()), 1)
+        except (tk.TclError, ValueError):
+            return default_workers()
+
+
+class ZoopMetricsWindow(tix.Toplevel):
+    def __init__(self, parent, summary):
+        tix.Toplevel.__init__(self, parent)
+        self.title('Conversion metrics')
+        self.geometry('620x460')
+
+        main_frame = ttk.Frame(self)
+        main_frame.pack(fill=tk.BOTH, expand=tk.YES)
+
+        totals = '{} file(s) - {} failed - {:.2f}s of conversion time - {} read - {} written'.format(
+            summary.files, summary.failures, summary.elapsed, format_bytes(summary.input_bytes), format_bytes(summary.output_bytes))
+        ttk.Label(main_frame, text=totals).pack(anchor='nw', padx=12, pady=(12, 6))
+
+        ttk.Label(main_frame, text='⏱ Time per stage', font='Calibri 11 bold').pack(anchor='nw', padx=12)
+        stages = ttk.Treeview(main_frame, columns=('Stage', 'Total', 'Per file', 'Share'), show='headings', height=6)
+        for column, width in (('Stage', 120), ('Total', 120), ('Per file', 120), ('Share', 100)):
+            stages.heading(column, text=column)
+            stages.column(column, width=width, anchor=tk.CENTER)
+        for stage, total, per_file, share in summary.stage_table():
+            stages.insert('', 'end', values=(stage, '{:.3f} s'.format(total), '{:.1f} ms'.format(per_file * 1000), '{:.0%}'.format(share)))
+        stages.pack(fill=tk.X, padx=12, pady=(0, 12))
+
+        ttk.Label(main_frame, text='🐢 Slowest files', font='Calibri 11 bold').pack(anchor='nw', padx=12)
+        slowest_frame = ttk.Frame(main_frame)
+        slowest = ttk.Treeview(slowest_frame, columns=('File', 'Time', 'Slowest stage'), show='headings')
+        slowest.heading('File', text='File')
+        slowest.heading('Time', text='Time')
+        slowest.heading('Slowest stage', text='Slowest stage')
+        slowest.column('File', width=300, anchor=tk.W)
+        slowest.column('Time', width=100, anchor=tk.CENTER)
+        slowest.column('Slowest stage', width=160, anchor=tk.CENTER)
+        for elapsed, source, timings in summary.slowest():
+            stage = max(timings, key=timings.get) if timings else '-'
+            stage_time = '{} ({:.1f} ms)'.format(stage, timings[stage] * 1000) if timings else '-'
+            slowest.insert('', 'end', values=(source, '{:.1f} ms'.format(elapsed * 1000), stage_time))
+
+        scrollbar = ttk.Scrollbar(slowest_frame, orient='vertical', command=slowest.yview)
+        slowest.configure(yscrollcommand=scrollbar.set)
+        slowest.pack(side=tk.LEFT, fill=tk.BOTH, expand=tk.YES)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        slowest_frame.pack(fill=tk.BOTH, expand=tk.YES, padx=12, pady=(0, 12))
+
 
 class ZoopMessageBox(tix.Toplevel):
     def __init__(self, parent, title='Zoop Says...', msg='Nothing to say', buttons=["Yes", "No", "Cancel"], buttons_cmds=[None, None, None], image='res/Icons/alert.png'):
@@ -494,9 +1337,7 @@ class ZoopMessageBox(tix.Toplevel):
         self.geometry("+{}+{}".format(positionRight, positionDown))
         self.overrideredirect(True)
 
-        img_temp = Image.open(image)
-        img_temp = img_temp.resize((90, 90), Image.ANTIALIAS)
-        self.img = ImageTk.PhotoImage(img_temp)
+        self.img = load_icon(image)
 
         main_frame = tk.Frame(self, highlightbackground="red",
                             highlightcolor="red",
@@ -538,6 +1379,10 @@ class ToolBar(ttk.Frame):
         self.tooltip.assignTooltip(self.add_files, msg="Add image(s)")
         self.add_files.pack(side=tk.LEFT, pady=10, padx=5, expand=tk.NO)
 
+        self.add_folder = ttk.Button(self, text='📁', command=self.parent.callOpenFolder, width=3)
+        self.tooltip.assignTooltip(self.add_folder, msg="Add every image of a folder (and its sub-folders)")
+        self.add_folder.pack(side=tk.LEFT, pady=10, padx=5, expand=tk.NO)
+
         self.remove_files = ttk.Button(self, text='➖', command=self.parent.callRemoveImage, width=3)
         self.tooltip.assignTooltip(self.remove_files, msg="Remove image(s)")
         self.remove_files.pack(side=tk.LEFT, pady=10, padx=5, expand=tk.NO)
@@ -554,11 +1399,31 @@ class ToolBar(ttk.Frame):
         self.tooltip.assignTooltip(self.convert_all, msg="Click here to convert all the images from the list.")
         self.convert_all.pack(side=tk.LEFT, pady=10, padx=5)
 
+        self.cancel_btn = ttk.Button(self, text='Cancel ✖', command=self.parent.callCancelConversion, state=tk.DISABLED)
+        self.tooltip.assignTooltip(self.cancel_btn, msg="Stop the running conversion once the current files are done.")
+        self.cancel_btn.pack(side=tk.LEFT, pady=10, padx=5)
+
         self.status_label = ttk.Label(self, text='❗ Zoop V0.1')
         self.status_label.pack(side=tk.RIGHT, pady=10, padx=15)
 
+        self.progress_label = ttk.Label(self, text='')
+        self.progress_label.pack(side=tk.RIGHT, pady=10, padx=5)
+
+        self.progressbar = ttk.Progressbar(self, orient='horizontal', mode='determinate', length=140)
+        self.progressbar.pack(side=tk.RIGHT, pady=10, padx=5)
+
         self.pack(fill=tk.X, side=tk.BOTTOM)
 
+    def showProgress(self, progress):
+        self.cancel_btn.config(state=tk.NORMAL)
+        self.progressbar.config(maximum=max(progress.total, 1), value=progress.done)
+        self.progress_label.config(text='{}/{} - {:.1f} files/s - ETA {}'.format(progress.done, progress.total, progress.rate, format_duration(progress.eta)))
+
+    def resetProgress(self):
+        self.cancel_btn.config(state=tk.DISABLED)
+        self.progressbar.config(value=0)
+        self.progress_label.config(text='')
+
 
 class Window(tix.Tk):
     def __init__(self):
@@ -571,9 +1436,10 @@ class Window(tix.Tk):
         
         self.theme = ttk.Style(self)
 
+        # Only the packages are declared here, sourcing a theme is slow and is
+        # left to load_theme() for the one actually used.
+        self.tk.call('set', 'base_theme_dir', THEME_DIR)
         self.tk.eval("""
-            set base_theme_dir themes/
-
             package ifneeded awthemes 10.3.0 \
                 [list source [file join $base_theme_dir awthemes-10.3.0/awthemes.tcl]]
             package ifneeded colorutils 4.8 \
@@ -584,9 +1450,6 @@ class Window(tix.Tk):
                 [list source [file join $base_theme_dir awthemes-10.3.0/awlight.tcl]]
         """)
 
-        self.tk.call("package", "require", 'awdark')
-        self.tk.call("package", "require", 'awlight')
-        
         self.bind('<Escape>', self.quit)
         self.set_saved_theme()
         self.__setupMenu()
@@ -600,10 +1463,33 @@ class Window(tix.Tk):
                 self.data = pickle.load(rec)
 
         except:
-            self.data = {'theme': 'awdark'}
+            self.data = {'theme': DEFAULT_THEME}
 
+        if not self.load_theme(self.data['theme']):
+            self.data['theme'] = DEFAULT_THEME if self.load_theme(DEFAULT_THEME) else self.theme.theme_use()
         self.theme.theme_use(self.data['theme'])
 
+    def load_theme(self, name):
+        if name in self.theme.theme_names():
+            return True
+        if name not in AW_THEMES:
+            return False
+
+        try:
+            self.tk.call('package', 'require', name)
+        except tk.TclError as e:
+            print('WARNING : Cannot load theme {} ({})'.format(name, e))
+            return False
+        return True
+
+    def available_themes(self):
+        themes = list(self.theme.theme_names())
+        return themes + [theme for theme in AW_THEMES if theme not in themes]
+
+    def save_preferences(self):
+        with open('preferences.zoopdat', 'wb') as rec:
+            pickle.dump(self.data, rec)
+
     def __setupMenu(self):
         self.mb = MenuBar(self)
 
@@ -618,32 +1504,51 @@ class Window(tix.Tk):
 
     def __doShorcutsBindings(self):
         self.bind('<Control-a>', self.inputFrame.openImageFiles)
+        self.bind('<Control-f>', self.callOpenFolder)
         self.bind('<Control-d>', self.callRemoveImage)
         self.bind('<Control-Alt-d>', self.callRemoveAll)
         self.bind('<Control-o>', self.callConvertAll)
         self.bind('<Control-l>', self.callConvertSelected)
+        self.bind('<Control-k>', self.callCancelConversion)
+        self.bind('<Control-w>', self.callWatchFolder)
 
     def callOpenImg(self, evt=None):
         self.inputFrame.openImageFiles(None)
 
+    def callOpenFolder(self, evt=None):
+        self.inputFrame.openImageFolder()
+
     def showConvertingState(self):
         self.optionsFrame.logview.logview_state.set('Converting...')
         self.optionsFrame.logview.logviewstatelabel.update()
 
     def callConvertSelected(self, evt=None):
-        self.showConvertingState()
-        self.inputFrame.Convert(mode='selected')
+        if not self.inputFrame.isConverting():
+            self.showConvertingState()
+            self.inputFrame.Convert(mode='selected')
 
     def callConvertAll(self, evt=None):
-        self.showConvertingState()
-        self.inputFrame.Convert(mode='all')
+        if not self.inputFrame.isConverting():
+            self.showConvertingState()
+            self.inputFrame.Convert(mode='all')
+
+    def callCancelConversion(self, evt=None):
+        self.inputFrame.cancelConversion()
+
+    def callShowMetrics(self, evt=None):
+        self.inputFrame.showMetrics()
+
+    def callWatchFolder(self, evt=None):
+        self.inputFrame.watchFolder()
+
+    def callStopWatching(self, evt=None):
+        self.inputFrame.stopWatching()
     
     def callRemoveImage(self, evt=None):
         try:
             to_remove = self.inputFrame.remove_selected()
 
-            for i in to_remove:
-                self.inputFrame.not_concerned_paths.append(i)
+            self.inputFrame.jobs.remove(to_remove)
         except UnboundLocalError:
             pass
 
@@ -653,15 +1558,21 @@ class Window(tix.Tk):
         
     def callClearAll(self, evt=None):
         self.inputFrame.clear_all()
-        self.inputFrame.paths_list = []
-        self.inputFrame.not_concerned_paths = []
+        self.inputFrame.jobs.clear()
+        self.inputFrame.ingest_iter = None
 
     def destroy_msg(self):
         self.msgbox.destroy()
 
     def quit(self, evt):
+        self.inputFrame.cancelConversion(keep_queue=True)
+        self.inputFrame.stopWatching()
+        self.inputFrame.thumbnails.close()
+        self.inputFrame.probes.close()
+        if self.inputFrame.store is not None:
+            self.inputFrame.store.close()
         self.destroy()
 
 
-if __name__ in '__main__':
+if __name__ == '__main__':
     Window().mainloop()
\ No newline at end of file
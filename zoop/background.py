@@ -0,0 +1,180 @@
+import queue
+import threading
+import time
+
+from zoop.engine import ConversionEngine, ConversionResult
+from zoop.metrics import MetricsSummary
+from zoop.dedup import resolve_collisions
+from zoop.probe import schedule_jobs
+from zoop.tree import group_by_directory, prepare_directories
+from zoop.writer import DEFAULT_FSYNC, DEFAULT_IO_WORKERS
+
+PREPARING_INTERVAL = 0.25
+
+
+def format_duration(seconds):
+    if seconds is None:
+        return '--:--:--'
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return '{}:{:02d}:{:02d}'.format(hours, minutes, seconds)
+
+
+class Progress:
+    def __init__(self, total):
+        self.total = total
+        self.success = 0
+        self.aborted = 0
+        self.skipped = 0
+        self.started = time.perf_counter()
+        self.finished = None
+
+    @property
+    def done(self):
+        return self.success + self.aborted + self.skipped
+
+    @property
+    def cancelled(self):
+        return self.total - self.done
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def rate(self):
+        elapsed = self.elapsed
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def eta(self):
+        rate = self.rate
+        if not rate:
+            return None
+        return (self.total - self.done) / rate
+
+    def update(self, result):
+        if result.ok:
+            self.success += 1
+        else:
+            self.aborted += 1
+
+
+class ConversionTask(threading.Thread):
+    def __init__(self, jobs, workers=None, manifest=None, metrics=None, memory_budget=None, dedup=None, probes=None,
+                 store=None, batch=None, settings=None, io_workers=DEFAULT_IO_WORKERS, fsync=DEFAULT_FSYNC, by_directory=False):
+        threading.Thread.__init__(self, daemon=True)
+        self.jobs = list(jobs)
+        self.workers = workers
+        self.memory_budget = memory_budget
+        self.dedup = dedup
+        self.io_workers = io_workers
+        self.fsync = fsync
+        self.by_directory = by_directory
+        self.probes = probes
+        self.manifest = manifest
+        self.metrics = metrics
+        self.summary = metrics.summary if metrics is not None else MetricsSummary()
+        self.store = store
+        self.batch = batch
+        self.settings = settings
+        self.keep_queue = False
+        self.events = queue.Queue()
+        self.progress = Progress(len(self.jobs))
+        self._cancel_event = threading.Event()
+        self._last_preparing = 0.0
+
+    @property
+    def is_cancelled(self):
+        return self._cancel_event.is_set()
+
+    def cancel(self, keep_queue=False):
+        # keep_queue leaves the unfinished jobs in the store so the batch is
+        # resumed on the next start, e.g. when the window is closed.
+        self.keep_queue = keep_queue
+        self._cancel_event.set()
+
+    def preparing(self, stage, done, total):
+        # Hashing and probing come before the first result, throttled so a
+        # huge batch doesn't flood the event queue.
+        now = time.perf_counter()
+        if done == total or now - self._last_preparing >= PREPARING_INTERVAL:
+            self._last_preparing = now
+            self.events.put(('preparing', (stage, done, total)))
+
+    def run(self):
+        try:
+            jobs = self.jobs
+            renamed = resolve_collisions(jobs)
+            if renamed:
+                self.events.put(('renamed', renamed))
+            prepare_directories(jobs)
+
+            if self.store is not None and self.batch is None:
+                self.batch = self.store.add_batch(jobs, self.settings)
+
+            if self.manifest is not None:
+                jobs, skipped = self.manifest.partition(jobs)
+                self.progress.skipped = len(skipped)
+                if self.store is not None:
+                    for job in skipped:
+                        self.store.record(ConversionResult(job, True, skipped=True))
+                if skipped:
+                    self.events.put(('skipped', skipped))
+
+            if self.dedup is not None:
+                jobs = self.dedup.plan(jobs, self._cancel_event, lambda done, total: self.preparing('hash', done, total))
+                if self.dedup.duplicate_count and not self.is_cancelled:
+                    self.events.put(('duplicates', self.dedup.duplicate_count))
+
+            if not self.is_cancelled:
+                jobs = schedule_jobs(jobs, self.probes, cancel_event=self._cancel_event,
+                                     progress=lambda done, total: self.preparing('probe', done, total))
+            if self.by_directory:
+                jobs = group_by_directory(jobs)
+
+            if not self.is_cancelled:
+                self.convert(jobs)
+        except Exception as e:
+            self.keep_queue = True
+            self.events.put(('error', e))
+        finally:
+            if self.store is not None and self.batch is not None:
+                if self.keep_queue:
+                    self.store.flush()
+                else:
+                    self.store.finish_batch(self.batch)
+            if self.metrics is not None:
+                self.metrics.close()
+            if self.manifest is not None:
+                try:
+                    self.manifest.save()
+                except OSError as e:
+                    self.events.put(('error', e))
+
+        self.progress.finished = time.perf_counter()
+        self.events.put(('finished', self.progress))
+
+    def convert(self, jobs):
+        with ConversionEngine(workers=self.workers, memory_budget=self.memory_budget, io_workers=self.io_workers, fsync=self.fsync) as engine:
+            for converted in engine.run(jobs, cancel_event=self._cancel_event):
+                for result in self.dedup.expand(converted) if self.dedup is not None else (converted,):
+                    self.progress.update(result)
+                    if self.manifest is not None:
+                        self.manifest.record(result)
+                    if self.metrics is not None:
+                        self.metrics.record(result)
+                    else:
+                        self.summary.add(result)
+                    if self.store is not None:
+                        self.store.record(result)
+                    self.events.put(('result', result))
+
+    def drain(self, limit=500):
+        events = []
+        try:
+            while len(events) < limit:
+                events.append(self.events.get_nowait())
+        except queue.Empty:
+            pass
+        return events
@@ -0,0 +1,275 @@
+import argparse
+import json
+import os
+import signal
+import sys
+import time
+
+from zoop.engine import ConversionEngine, ConversionResult, make_jobs, default_workers
+from zoop.formats import SUPPORTED_FILES_EXT, format_for_ext, normalize_ext
+from zoop.dedup import DEDUP_MODES, Deduplicator, resolve_collisions
+from zoop.manifest import Manifest
+from zoop.memory import BOMB_POLICIES, DEFAULT_BOMB_POLICY, default_memory_budget
+from zoop.metrics import MetricsSink, MetricsSummary
+from zoop.modes import ICC_POLICIES, DEFAULT_ICC_POLICY, DEFAULT_BACKGROUND, parse_background
+from zoop.passthrough import SAME_FORMAT_MODES, DEFAULT_SAME_FORMAT, METADATA_POLICIES, DEFAULT_METADATA
+from zoop.probe import ProbeCache, schedule_jobs
+from zoop.profiles import PROFILE_NAMES, DEFAULT_PROFILE, save_options
+from zoop.frames import FRAME_MODES, DEFAULT_FRAME_MODE
+from zoop.resize import RESAMPLING_FILTERS, DEFAULT_FILTER, parse_resize
+from zoop.scan import iter_sources
+from zoop.target import TARGET_SIZE_FORMATS, parse_target_size
+from zoop.tree import group_by_directory, prepare_directories, source_root
+from zoop.watch import DEFAULT_SETTLE, WatchTask
+from zoop.writer import FSYNC_POLICIES, DEFAULT_FSYNC, DEFAULT_IO_WORKERS
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='zoop', description='Zoop Image Converter')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    convert = commands.add_parser('convert', help='convert images without starting the GUI')
+    convert.add_argument('inputs', nargs='+', help='image files, glob patterns or directories (walked recursively)')
+    add_output_arguments(convert)
+    convert.add_argument('--dedup', choices=DEDUP_MODES, default='off',
+                         help='encode byte-identical sources once and hard-link or copy the result to the other outputs (default: %(default)s)')
+    convert.add_argument('--order', choices=['largest', 'input'], default='largest',
+                         help='convert the largest images first to balance the workers, or keep the input order (default: %(default)s)')
+    convert.add_argument('-i', '--incremental', action='store_true', help='skip sources whose output is already up to date')
+    convert.add_argument('--indent', type=int, default=None, help='indent the JSON summary')
+    convert.set_defaults(func=cmd_convert)
+
+    watch = commands.add_parser('watch', help='convert images as they are dropped into a folder, until interrupted')
+    watch.add_argument('directory', help='folder to watch')
+    add_output_arguments(watch)
+    watch.add_argument('--no-recursive', dest='recursive', action='store_false', help='only watch the folder itself, not its subfolders')
+    watch.add_argument('--settle', type=float, default=DEFAULT_SETTLE,
+                       help='seconds a file must stay unchanged before it is converted (default: %(default)s)')
+    watch.add_argument('--existing', action='store_true', help='also convert the images already in the folder')
+    watch.add_argument('--poll', action='store_true', help='poll the folder instead of using inotify')
+    watch.set_defaults(func=cmd_watch)
+
+    return parser
+
+
+def add_output_arguments(parser):
+    parser.add_argument('-f', '--format', required=True, help='output format, one of ' + ', '.join(SUPPORTED_FILES_EXT))
+    parser.add_argument('-o', '--output-dir', required=True, help='directory the converted images are written to')
+    parser.add_argument('--mirror', action='store_true',
+                         help='recreate the source folder tree under the output directory instead of writing every image into it')
+    parser.add_argument('-w', '--workers', type=int, default=default_workers(), help='number of worker processes (default: %(default)s)')
+    parser.add_argument('--io-workers', type=int, default=DEFAULT_IO_WORKERS,
+                         help='threads writing the encoded outputs, 0 writes from the worker processes (default: %(default)s)')
+    parser.add_argument('--fsync', choices=FSYNC_POLICIES, default=DEFAULT_FSYNC,
+                         help='flush outputs to disk before (file) or also after (full) renaming them into place (default: %(default)s)')
+    parser.add_argument('-p', '--profile', choices=PROFILE_NAMES, default=DEFAULT_PROFILE, help='encoding profile (default: %(default)s)')
+    resize = parser.add_mutually_exclusive_group()
+    resize.add_argument('--max-size', metavar='PIXELS', help='downscale so the longest side is at most PIXELS')
+    resize.add_argument('--size', metavar='WxH', help='resize to exactly WxH pixels')
+    resize.add_argument('--scale', metavar='FACTOR', help='resize by FACTOR (e.g. 0.5)')
+    parser.add_argument('--filter', choices=sorted(RESAMPLING_FILTERS), default=DEFAULT_FILTER, help='resampling filter (default: %(default)s)')
+    parser.add_argument('--frames', choices=FRAME_MODES, default=DEFAULT_FRAME_MODE,
+                         help='animated/multi-size sources: keep the animation, keep the first frame or extract every frame (default: %(default)s)')
+    parser.add_argument('--background', default=DEFAULT_BACKGROUND,
+                         help='colour transparent images are flattened on for formats without alpha (default: %(default)s)')
+    parser.add_argument('--icc', choices=ICC_POLICIES, default=DEFAULT_ICC_POLICY,
+                         help='keep the embedded colour profile, convert to sRGB or strip it (default: %(default)s)')
+    parser.add_argument('--same-format', choices=SAME_FORMAT_MODES, default=DEFAULT_SAME_FORMAT,
+                         help='sources already in the output format and needing no pixel changes are copied, hard-linked or re-encoded anyway (default: %(default)s)')
+    parser.add_argument('--metadata', choices=METADATA_POLICIES, default=DEFAULT_METADATA,
+                         help='strip EXIF/XMP/comments when copying JPEG to JPEG, without re-encoding; re-encoded outputs never keep them (default: %(default)s)')
+    parser.add_argument('--target-size', metavar='KB',
+                         help='search the JPEG/WebP quality so every output is at most KB kilobytes')
+    parser.add_argument('--memory-budget', type=int, metavar='MB', default=None,
+                         help='admit jobs against this many MB of estimated decoded images (default: half the RAM, 0 disables); '
+                              'an image bigger than the budget runs alone and is still decoded in full, only its output is streamed to disk')
+    parser.add_argument('--bomb-policy', choices=BOMB_POLICIES, default=DEFAULT_BOMB_POLICY,
+                         help="what to do with images above Pillow's decompression bomb limit: refuse them, convert them with a warning "
+                              "or ignore the limit (default: %(default)s)")
+    parser.add_argument('--metrics', metavar='FILE', help='append per-file stage timings to FILE as JSON lines')
+
+
+def build_options(args):
+    # Raises ValueError with a message for the user on invalid arguments.
+    output_ext = normalize_ext(args.format)
+    if output_ext not in SUPPORTED_FILES_EXT:
+        raise ValueError('unsupported output format {}'.format(args.format))
+
+    options = {'save': save_options(output_ext, args.profile), 'frames': args.frames, 'bomb_policy': args.bomb_policy, 'icc': args.icc,
+               'background': parse_background(args.background), 'same_format': args.same_format, 'metadata': args.metadata}
+    if args.max_size is not None:
+        options['resize'] = parse_resize('max', args.max_size, args.filter)
+    elif args.size is not None:
+        options['resize'] = parse_resize('exact', args.size, args.filter)
+    elif args.scale is not None:
+        options['resize'] = parse_resize('scale', args.scale, args.filter)
+
+    if args.target_size is not None:
+        target_size = parse_target_size(args.target_size)
+        if target_size is not None:
+            if format_for_ext(output_ext) not in TARGET_SIZE_FORMATS:
+                raise ValueError('a target size needs a JPEG or WebP output format')
+            options['target_size'] = target_size
+
+    if args.memory_budget is None:
+        memory_budget = default_memory_budget()
+    else:
+        memory_budget = args.memory_budget * 1024 * 1024 or None
+
+    return output_ext, options, memory_budget
+
+
+def cmd_convert(args):
+    try:
+        output_ext, options, memory_budget = build_options(args)
+    except ValueError as e:
+        print('zoop: {}'.format(e), file=sys.stderr)
+        return 2
+
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    unmatched = []
+    sources = list(iter_sources(args.inputs, unmatched))
+    for pattern in unmatched:
+        print('zoop: {} matches no file'.format(pattern), file=sys.stderr)
+    jobs = make_jobs(sources, args.output_dir, output_ext, options, root=source_root(sources) if args.mirror else None)
+    renamed = resolve_collisions(jobs)
+    for source, target, new_target in renamed:
+        print('zoop: {} would overwrite {}, writing {} instead'.format(source, target, new_target), file=sys.stderr)
+    prepare_directories(jobs)
+
+    start = time.perf_counter()
+    files = []
+    manifest = None
+    metrics = MetricsSink(args.metrics) if args.metrics else None
+    totals = metrics.summary if metrics is not None else MetricsSummary()
+    if args.incremental:
+        manifest = Manifest(args.output_dir)
+        jobs, skipped = manifest.partition(jobs)
+        files.extend(ConversionResult(job, True, skipped=True).as_dict() for job in skipped)
+
+    dedup = None
+    if args.dedup != 'off':
+        dedup = Deduplicator(args.dedup, args.fsync)
+        jobs = dedup.plan(jobs)
+
+    mislabeled = []
+    if args.order == 'largest':
+        probes = ProbeCache()
+        jobs = schedule_jobs(jobs, probes)
+        for job in jobs:
+            info = probes.get(job.source)
+            if info is not None and info.is_mislabeled(job.source):
+                mislabeled.append({'source': job.source, 'format': info.format})
+                print('zoop: {} is actually a {} file'.format(job.source, info.format), file=sys.stderr)
+    if args.mirror:
+        jobs = group_by_directory(jobs)
+
+    try:
+        with ConversionEngine(workers=max(args.workers, 1), memory_budget=memory_budget, io_workers=max(args.io_workers, 0),
+                              fsync=args.fsync) as engine:
+            for converted in engine.run(jobs):
+                for result in dedup.expand(converted) if dedup is not None else (converted,):
+                    if manifest is not None:
+                        manifest.record(result)
+                    if metrics is not None:
+                        metrics.record(result)
+                    else:
+                        totals.add(result)
+                    files.append(result.as_dict())
+    finally:
+        if metrics is not None:
+            metrics.close()
+        if manifest is not None:
+            manifest.save()
+
+    success = sum(1 for f in files if f['ok'] and not f['skipped'])
+    skipped = sum(1 for f in files if f['skipped'])
+    summary = {
+        'format': output_ext,
+        'profile': args.profile,
+        'output_dir': args.output_dir,
+        'workers': max(args.workers, 1),
+        'total': len(files),
+        'success': success,
+        'aborted': len(files) - success - skipped,
+        'skipped': skipped,
+        'deduplicated': sum(1 for f in files if f['duplicate_of']),
+        'mislabeled': mislabeled,
+        'renamed': [{'source': source, 'target': target, 'renamed_to': new_target} for source, target, new_target in renamed],
+        'elapsed': round(time.perf_counter() - start, 6),
+        'metrics': totals.as_dict(),
+        'files': files,
+    }
+
+    json.dump(summary, sys.stdout, indent=args.indent)
+    sys.stdout.write('\n')
+    return 0 if success + skipped == len(files) and not unmatched else 1
+
+
+def cmd_watch(args):
+    # One JSON line per converted file and a stats line every second on
+    # stdout, Ctrl+C stops watching.
+    try:
+        output_ext, options, memory_budget = build_options(args)
+    except ValueError as e:
+        print('zoop: {}'.format(e), file=sys.stderr)
+        return 2
+    if not os.path.isdir(args.directory):
+        print('zoop: {} is not a directory'.format(args.directory), file=sys.stderr)
+        return 2
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    task = WatchTask(os.path.abspath(args.directory), os.path.abspath(args.output_dir), output_ext, options,
+                     workers=max(args.workers, 1), recursive=args.recursive, settle=args.settle, include_existing=args.existing,
+                     memory_budget=memory_budget, metrics=MetricsSink(args.metrics) if args.metrics else None,
+                     io_workers=max(args.io_workers, 0), fsync=args.fsync, use_inotify=not args.poll, mirror=args.mirror)
+    task.start()
+
+    failed = False
+
+    def write_events():
+        # Returns True once the task reported that it finished.
+        nonlocal failed
+        finished = False
+        for kind, payload in task.drain():
+            if kind == 'result':
+                line = payload.as_dict()
+            elif kind == 'stats':
+                line = {'stats': payload}
+            elif kind == 'watching':
+                line = {'watching': task.directory, 'backend': payload}
+            elif kind == 'renamed':
+                line = {'renamed': [{'source': source, 'target': target, 'renamed_to': new_target} for source, target, new_target in payload]}
+            elif kind == 'error':
+                failed = True
+                line = {'error': '{}: {}'.format(type(payload).__name__, payload)}
+            else:
+                finished = True
+                line = {'finished': payload.as_dict()}
+            json.dump(line, sys.stdout)
+            sys.stdout.write('\n')
+        sys.stdout.flush()
+        return finished
+
+    def interrupt(signum, frame):
+        # The files already being converted still finish, their results and
+        # the final stats are written before exiting. A second Ctrl+C stops
+        # right away.
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        task.cancel()
+
+    previous = signal.signal(signal.SIGINT, interrupt)
+    try:
+        while not write_events():
+            task.join(0.2)
+    finally:
+        signal.signal(signal.SIGINT, previous)
+
+    return 1 if failed else 0
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
@@ -0,0 +1,149 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from zoop.engine import ConversionResult
+from zoop.writer import DEFAULT_FSYNC, link_or_copy
+from zoop.frames import frame_path
+from zoop.hashing import file_digest
+
+DEDUP_MODES = ['off', 'link', 'copy']
+HASH_WORKERS = 4
+
+
+def path_key(path):
+    return os.path.normcase(os.path.abspath(path))
+
+
+def resolve_collisions(jobs, owners=None):
+    # Two sources must never write the same output file (a.png and a.jpg
+    # both becoming a.webp): later ones get their source extension appended.
+    # The same source listed twice is left alone, dedup handles that.
+    # Passing the same owners dict across calls keeps targets unique over a
+    # stream of jobs. Sources are taken in path order so the same files
+    # always get the same names, whatever order they were listed in.
+    owners = {} if owners is None else owners
+    renamed = []
+    for job in sorted(jobs, key=lambda job: path_key(job.source)):
+        key = path_key(job.target)
+        owner = owners.get(key)
+        if owner is None or path_key(owner) == path_key(job.source):
+            owners[key] = job.source
+            continue
+
+        root, ext = os.path.splitext(job.target)
+        source_ext = os.path.splitext(job.source)[1].lstrip('.').lower()
+        candidate = '{}_{}{}'.format(root, source_ext, ext)
+        count = 2
+        while path_key(candidate) in owners:
+            candidate = '{}_{}{}{}'.format(root, source_ext, count, ext)
+            count += 1
+
+        renamed.append((job.source, job.target, candidate))
+        job.target = candidate
+        owners[path_key(candidate)] = job.source
+
+    return renamed
+
+
+def digest_sources(paths, workers=HASH_WORKERS, cancel_event=None, progress=None):
+    # Only files sharing their size with another file can be identical, so
+    # everything else is never read. progress(done, total) is called after
+    # every file; once cancel_event is set the remaining files are skipped.
+    by_size = {}
+    for path in paths:
+        try:
+            by_size.setdefault(os.path.getsize(path), []).append(path)
+        except OSError:
+            continue
+
+    candidates = [path for group in by_size.values() if len(group) > 1 for path in group]
+
+    def digest(path):
+        try:
+            return path, file_digest(path)
+        except OSError:
+            return path, None
+
+    digests = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(digest, path) for path in candidates]
+        try:
+            for done, future in enumerate(futures, 1):
+                if cancel_event is not None and cancel_event.is_set():
+                    break
+                path, value = future.result()
+                if value is not None:
+                    digests[path] = value
+                if progress is not None:
+                    progress(done, len(futures))
+        finally:
+            for future in futures:
+                future.cancel()
+    return digests
+
+
+class Deduplicator:
+    def __init__(self, mode='link', fsync=DEFAULT_FSYNC):
+        self.mode = mode
+        self.fsync = fsync
+        self.duplicates = {}
+        self.digests = {}
+
+    def plan(self, jobs, cancel_event=None, progress=None):
+        jobs = list(jobs)
+        self.digests = digest_sources([job.source for job in jobs], cancel_event=cancel_event, progress=progress)
+
+        primaries = []
+        first = {}
+        for job in jobs:
+            digest = self.digests.get(job.source)
+            if digest is None:
+                primaries.append(job)
+                continue
+
+            key = (digest, repr(sorted(job.options.items())), os.path.splitext(job.target)[1].lower())
+            primary = first.get(key)
+            if primary is None:
+                first[key] = job
+                primaries.append(job)
+            else:
+                self.duplicates.setdefault(path_key(primary.target), []).append(job)
+
+        return primaries
+
+    @property
+    def duplicate_count(self):
+        return sum(len(jobs) for jobs in self.duplicates.values())
+
+    def expand(self, result):
+        yield result
+
+        for job in self.duplicates.pop(path_key(result.target), []):
+            yield self._materialize(result, job)
+
+    def _materialize(self, primary, job):
+        start = time.perf_counter()
+        if not primary.ok:
+            return ConversionResult(job, False, error='Identical to {} which failed : {}'.format(primary.source, primary.error),
+                                    duplicate_of=primary.source)
+
+        outputs = []
+        try:
+            for index, output in enumerate(primary.outputs):
+                target = job.target if output == primary.target else frame_path(job.target, index)
+                link_or_copy(output, target, self.mode, self.fsync)
+                outputs.append(target)
+
+            fingerprint = None
+            if job.fingerprint:
+                stat = os.stat(job.source)
+                fingerprint = (stat.st_size, stat.st_mtime_ns, self.digests[job.source])
+        except OSError as e:
+            return ConversionResult(job, False, error='{}: {}'.format(type(e).__name__, e), elapsed=time.perf_counter() - start,
+                                    duplicate_of=primary.source)
+
+        elapsed = time.perf_counter() - start
+        return ConversionResult(job, True, elapsed=elapsed, fingerprint=fingerprint, timings={'write': elapsed},
+                                input_bytes=primary.input_bytes, output_bytes=primary.output_bytes, outputs=outputs,
+                                duplicate_of=primary.source)
@@ -0,0 +1,408 @@
+import os
+import io
+import time
+import signal
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from PIL import Image
+
+from zoop.formats import format_for_ext
+from zoop.frames import ANIMATED_FORMATS, DEFAULT_FRAME_MODE, ico_sizes, is_multiframe, iter_frames, frame_path, save_animation
+from zoop.hashing import file_digest
+from zoop.memory import DEFAULT_BOMB_POLICY, MemoryBudget, apply_bomb_policy, check_bomb, estimate_footprint
+from zoop.metrics import StageTimer
+from zoop.modes import normalize_image
+from zoop.passthrough import pass_through, passthrough_mode
+from zoop.resize import prepare_resize, resize_image
+from zoop.target import TARGET_SIZE_FORMATS, encode_to_size
+from zoop.writer import DEFAULT_FSYNC, DEFAULT_IO_WORKERS, OutputWriter, atomic_output
+
+
+class ConversionJob:
+    def __init__(self, source, target, options=None):
+        self.source = source
+        self.target = target
+        self.options = options or {}
+        self.fingerprint = False
+        self.footprint = 0
+        self.oversized = False
+        self.queue_id = None
+        self.defer_write = False
+        self.fsync = DEFAULT_FSYNC
+
+
+class ConversionResult:
+    def __init__(self, job, ok, error=None, elapsed=0.0, skipped=False, fingerprint=None, timings=None, input_bytes=0, output_bytes=0, outputs=None, warnings=None, duplicate_of=None, payloads=None, attempts=0, quality=None, passthrough=None):
+        self.job = job
+        self.ok = ok
+        self.error = error
+        self.elapsed = elapsed
+        self.skipped = skipped
+        self.fingerprint = fingerprint
+        self.timings = timings or {}
+        self.input_bytes = input_bytes
+        self.output_bytes = output_bytes
+        self.outputs = outputs or []
+        self.warnings = warnings or []
+        self.duplicate_of = duplicate_of
+        self.payloads = payloads or []
+        self.attempts = attempts
+        self.quality = quality
+        self.passthrough = passthrough
+
+    @property
+    def source(self):
+        return self.job.source
+
+    @property
+    def target(self):
+        return self.job.target
+
+    def as_dict(self):
+        return {
+            'source': self.source,
+            'target': self.target,
+            'ok': self.ok,
+            'skipped': self.skipped,
+            'error': self.error,
+            'elapsed': round(self.elapsed, 6),
+            'timings': {stage: round(seconds, 6) for stage, seconds in self.timings.items()},
+            'input_bytes': self.input_bytes,
+            'output_bytes': self.output_bytes,
+            'outputs': self.outputs,
+            'warnings': self.warnings,
+            'duplicate_of': self.duplicate_of,
+            'attempts': self.attempts,
+            'quality': self.quality,
+            'passthrough': self.passthrough,
+        }
+
+
+def build_output_path(source, output_dir, output_ext, root=None):
+    # With a root, the source's folders below it are recreated under
+    # output_dir, otherwise every output lands in output_dir itself.
+    img_filename = os.path.splitext(os.path.basename(source))[0] + output_ext
+    if root is not None:
+        try:
+            relative = os.path.relpath(os.path.dirname(os.path.abspath(source)), root)
+        except ValueError:
+            relative = os.curdir
+        if relative != os.curdir and relative != os.pardir and not relative.startswith(os.pardir + os.sep):
+            return os.path.join(output_dir, relative, img_filename)
+    return os.path.join(output_dir, img_filename)
+
+
+def make_jobs(sources, output_dir, output_ext, options=None, root=None):
+    return [ConversionJob(src, build_output_path(src, output_dir, output_ext, root), options) for src in sources]
+
+
+def source_fingerprint(path):
+    stat = os.stat(path)
+    return (stat.st_size, stat.st_mtime_ns, file_digest(path))
+
+
+def output_format(path):
+    ext = os.path.splitext(path)[1].lower()
+    return format_for_ext(ext) or Image.registered_extensions().get(ext)
+
+
+def encode_image(image, format, params):
+    buffer = io.BytesIO()
+    image.save(buffer, format=format, **params)
+    return buffer
+
+
+def write_output(path, buffer, fsync=DEFAULT_FSYNC):
+    with atomic_output(path, fsync) as f:
+        f.write(buffer.getbuffer())
+
+
+def convert_file(job):
+    start = time.perf_counter()
+    timer = StageTimer()
+    fingerprint = None
+    input_bytes = 0
+    output_bytes = 0
+    outputs = []
+    warnings = []
+    payloads = []
+    attempts = 0
+    quality = None
+    passthrough = None
+    bomb_policy = job.options.get('bomb_policy', DEFAULT_BOMB_POLICY)
+    try:
+        apply_bomb_policy(bomb_policy)
+
+        if job.fingerprint:
+            fingerprint = source_fingerprint(job.source)
+            timer.lap('hash')
+
+        input_bytes = os.path.getsize(job.source)
+        with Image.open(job.source) as image:
+            timer.lap('open')
+
+            warning = check_bomb(image, bomb_policy)
+            if warning:
+                warnings.append(warning)
+
+            format = output_format(job.target)
+            passthrough = passthrough_mode(image, format, job.options)
+            if passthrough is not None:
+                # Nothing to do with the pixels: the file is copied, linked
+                # or has JPEG segments dropped without ever being decoded.
+                output = pass_through(image, job.source, passthrough, job.options)
+                if job.defer_write:
+                    payloads.append((job.target, output))
+                else:
+                    output_bytes = output.write(job.target, job.fsync)
+                    timer.lap('write')
+                outputs.append(job.target)
+                return ConversionResult(job, True, elapsed=time.perf_counter() - start, fingerprint=fingerprint,
+                                        timings=timer.timings, input_bytes=input_bytes, output_bytes=output_bytes,
+                                        outputs=outputs, warnings=warnings, payloads=payloads, passthrough=passthrough)
+
+            resize = job.options.get('resize')
+            size = prepare_resize(image, resize) if resize else None
+            image.load()
+            timer.lap('decode')
+
+            def transform(frame, size=None):
+                if resize:
+                    frame = resize_image(frame, resize, size)
+                frame, profile = normalize_image(frame, format, job.options)
+                if profile:
+                    params['icc_profile'] = profile
+                return frame
+
+            def encode(frame, target):
+                # With a target size the quality is searched for, the last
+                # attempt is the one kept.
+                nonlocal attempts, quality
+                if target_size is None:
+                    return encode_image(frame, format, params)
+                buffer, used, tries, fits = encode_to_size(frame, format, params, target_size)
+                attempts += tries
+                quality = used if quality is None else min(quality, used)
+                if not fits:
+                    warnings.append('{} is {} bytes at quality {}, above the {} byte target'.format(
+                        os.path.basename(target), buffer.tell(), used, target_size['bytes']))
+                return buffer
+
+            def emit(target, buffer):
+                # With an output writer the bytes go back to the parent and
+                # are written there, the worker moves on to the next image.
+                if job.defer_write:
+                    payloads.append((target, buffer.getvalue()))
+                else:
+                    write_output(target, buffer, job.fsync)
+                    timer.lap('write')
+                outputs.append(target)
+                return buffer.tell()
+
+            params = dict(job.options.get('save', {}))
+            frames = job.options.get('frames', DEFAULT_FRAME_MODE)
+            target_size = job.options.get('target_size') if format in TARGET_SIZE_FORMATS else None
+            multiframe = is_multiframe(image)
+
+            if frames == 'extract' and multiframe:
+                for index, frame in enumerate(iter_frames(image)):
+                    frame = transform(frame)
+                    timer.lap('transform')
+                    target = frame_path(job.target, index)
+                    buffer = encode(frame, target)
+                    timer.lap('encode')
+                    output_bytes += emit(target, buffer)
+            else:
+                if frames == 'animate' and multiframe and format in ANIMATED_FORMATS and image.format != 'ICO':
+                    buffer = io.BytesIO()
+                    save_animation(image, buffer, format, transform, **params)
+                    timer.lap('encode')
+                    if target_size is not None:
+                        warnings.append('target size is not applied to animations')
+                else:
+                    if frames == 'animate' and format == 'ICO' and not resize and ico_sizes(image):
+                        params.setdefault('sizes', ico_sizes(image))
+                    image = transform(image, size)
+                    timer.lap('transform')
+
+                    if job.oversized and target_size is None:
+                        # Too big to also hold the encoded bytes in memory:
+                        # let the encoder stream its output to disk instead.
+                        with atomic_output(job.target, job.fsync) as f:
+                            image.save(f, format=format, **params)
+                            output_bytes = f.tell()
+                        timer.lap('encode')
+                        outputs.append(job.target)
+                        buffer = None
+                    else:
+                        buffer = encode(image, job.target)
+                        timer.lap('encode')
+
+                if buffer is not None:
+                    output_bytes = emit(job.target, buffer)
+    except Image.DecompressionBombError as e:
+        return ConversionResult(job, False, error='Image too large for the decompression bomb limit ({}), '
+                                                  'change the bomb policy to convert it anyway'.format(e),
+                                elapsed=time.perf_counter() - start, timings=timer.timings, input_bytes=input_bytes)
+    except Exception as e:
+        return ConversionResult(job, False, error='{}: {}'.format(type(e).__name__, e), elapsed=time.perf_counter() - start,
+                                timings=timer.timings, input_bytes=input_bytes)
+
+    return ConversionResult(job, True, elapsed=time.perf_counter() - start, fingerprint=fingerprint,
+                            timings=timer.timings, input_bytes=input_bytes, output_bytes=output_bytes, outputs=outputs,
+                            warnings=warnings, payloads=payloads, attempts=attempts, quality=quality)
+
+
+IDLE_WAIT = 0.1
+
+
+def default_workers():
+    return os.cpu_count() or 1
+
+
+def ignore_interrupts():
+    # Ctrl+C is handled by the parent, which cancels the run and lets the
+    # workers finish their current file instead of dying with a traceback.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+class ConversionEngine:
+    def __init__(self, workers=None, memory_budget=None, io_workers=DEFAULT_IO_WORKERS, fsync=DEFAULT_FSYNC):
+        self.workers = workers or default_workers()
+        self.memory_budget = MemoryBudget(memory_budget) if memory_budget else None
+        self.fsync = fsync
+        # io_workers=0 keeps the writes in the worker processes.
+        self.writer = OutputWriter(io_workers, fsync=fsync) if io_workers else None
+        self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=ignore_interrupts)
+        return self._executor
+
+    def _restart_executor(self, broken):
+        # A worker that died (killed when out of memory, crash in a codec)
+        # breaks the whole pool: every job it held fails and a new pool
+        # takes the remaining ones.
+        if self._executor is broken:
+            broken.shutdown(wait=False)
+            self._executor = None
+        return self._get_executor()
+
+    def run(self, jobs, cancel_event=None):
+        # Only keep a couple of jobs per worker in flight so huge batches don't
+        # pile up pickled jobs in the call queue, while every core stays busy.
+        # This also bounds how long a cancel takes: queued jobs are dropped and
+        # only the files already being converted get to finish.
+        # With a memory budget, jobs are also admitted in order against
+        # their estimated decoded footprint before being submitted, and
+        # nothing new is submitted while the writer is backed up.
+        # jobs may be an endless generator (watch mode) yielding None while
+        # it has nothing to convert, the engine then idles until cancelled.
+        executor = self._get_executor()
+        budget = self.memory_budget
+        writer = self.writer
+        window = self.workers * 2
+        jobs = iter(jobs)
+        pending = {}
+        writing = {}
+        waiting = []
+        cancelled = False
+        exhausted = False
+
+        def submit(job):
+            nonlocal executor
+            try:
+                return executor.submit(convert_file, job)
+            except BrokenProcessPool:
+                executor = self._restart_executor(executor)
+                return executor.submit(convert_file, job)
+
+        def fill():
+            nonlocal exhausted
+            while len(pending) < window:
+                if writer is not None and writer.is_full:
+                    return
+                if not waiting:
+                    try:
+                        job = next(jobs)
+                    except StopIteration:
+                        exhausted = True
+                        return
+                    if job is None:
+                        return
+                    if budget is not None:
+                        try:
+                            job.footprint = estimate_footprint(job.source, job.options)
+                        except Image.DecompressionBombError:
+                            job.footprint = budget.limit + 1
+                        except Exception:
+                            job.footprint = 0
+                        job.oversized = budget.is_oversized(job.footprint)
+                    waiting.append(job)
+
+                job = waiting[0]
+                if budget is not None and not budget.try_acquire(job.footprint):
+                    return
+
+                waiting.pop()
+                job.defer_write = writer is not None
+                job.fsync = self.fsync
+                pending[submit(job)] = job
+
+        fill()
+        while pending or writing or not (exhausted or cancelled):
+            if not cancelled and cancel_event is not None and cancel_event.is_set():
+                cancelled = True
+                for future in pending:
+                    future.cancel()
+
+            if not pending and not writing:
+                if cancel_event is not None:
+                    cancel_event.wait(IDLE_WAIT)
+                else:
+                    time.sleep(IDLE_WAIT)
+                if not cancelled:
+                    fill()
+                continue
+
+            done, _ = wait(list(pending) + list(writing), timeout=0.1, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future in writing:
+                    del writing[future]
+                    yield future.result()
+                    continue
+
+                job = pending.pop(future)
+                if budget is not None:
+                    budget.release(job.footprint)
+                if future.cancelled():
+                    continue
+
+                try:
+                    result = future.result()
+                except BrokenProcessPool as e:
+                    executor = self._restart_executor(executor)
+                    yield ConversionResult(job, False, error='Worker process stopped while converting: {}'.format(e))
+                    continue
+                if result.payloads:
+                    writing[writer.submit(result)] = result
+                else:
+                    yield result
+
+            if not cancelled:
+                fill()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        if self.writer is not None:
+            self.writer.close()
@@ -0,0 +1,33 @@
+import os
+import json
+
+ZOOP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+with open(os.path.join(ZOOP_ROOT, 'res', 'supported.json'), 'r') as supported_files:
+    SUPPORTED_FILES_EXT = json.load(supported_files)
+
+
+def is_supported(path):
+    return os.path.splitext(path)[1].lower() in SUPPORTED_FILES_EXT
+
+
+def normalize_ext(ext):
+    ext = ext.lower()
+    if not ext.startswith('.'):
+        ext = '.' + ext
+    return ext
+
+
+FORMAT_NAMES = {
+    '.jpg': 'JPEG',
+    '.jpeg': 'JPEG',
+    '.bmp': 'BMP',
+    '.webp': 'WEBP',
+    '.png': 'PNG',
+    '.gif': 'GIF',
+    '.ico': 'ICO',
+}
+
+
+def format_for_ext(ext):
+    return FORMAT_NAMES.get(normalize_ext(ext))
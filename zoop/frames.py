@@ -0,0 +1,89 @@
+import os
+
+from PIL import ImageSequence
+
+FRAME_MODES = ['animate', 'first', 'extract']
+DEFAULT_FRAME_MODE = 'animate'
+ANIMATED_FORMATS = ('GIF', 'WEBP', 'PNG')
+DEFAULT_DURATION = 100
+
+
+def ico_sizes(image):
+    if image.format == 'ICO':
+        return sorted(image.info.get('sizes', ()))
+    return []
+
+
+def is_multiframe(image):
+    return getattr(image, 'n_frames', 1) > 1 or len(ico_sizes(image)) > 1
+
+
+def iter_frames(image):
+    # Frames are produced one at a time by seeking the source, never all
+    # decoded up front. Every frame is a copy since seeking mutates image.
+    sizes = ico_sizes(image)
+    if len(sizes) > 1:
+        for size in sizes:
+            yield image.ico.getimage(size)
+    else:
+        for frame in ImageSequence.Iterator(image):
+            yield frame.copy()
+
+
+def frame_path(path, index):
+    root, ext = os.path.splitext(path)
+    return '{}_{:04d}{}'.format(root, index, ext)
+
+
+def frame_durations(image):
+    durations = []
+    for frame in ImageSequence.Iterator(image):
+        # GIF and APNG frame headers carry the duration, WebP only sets it
+        # once the frame has been decoded.
+        if image.format == 'WEBP':
+            frame.load()
+        durations.append(frame.info.get('duration', DEFAULT_DURATION))
+    image.seek(0)
+    return durations
+
+
+def frames_mode(image):
+    # Frames of one animation can come out in different modes (a GIF's
+    # first frame is P, the next ones RGB or RGBA), the animated writers
+    # need them all in the same one. Seeking only reads the frame headers.
+    alpha = False
+    for frame in ImageSequence.Iterator(image):
+        if frame.mode in ('RGBA', 'LA', 'PA') or 'transparency' in frame.info:
+            alpha = True
+            break
+    image.seek(0)
+    return 'RGBA' if alpha else 'RGB'
+
+
+def loop_params(image, format):
+    # GIF plays once when it has no loop extension, WebP and APNG store a
+    # loop count of 1 instead; everything else loops as the source does.
+    loop = image.info.get('loop')
+    plays_once = loop is None if image.format == 'GIF' else loop == 1
+    if plays_once:
+        return {} if format == 'GIF' else {'loop': 1}
+    return {} if loop is None else {'loop': loop}
+
+
+def save_animation(image, fp, format, transform, **params):
+    for key, value in loop_params(image, format).items():
+        params.setdefault(key, value)
+    if format == 'WEBP':
+        # The WebP encoder wants every duration up front, GIF and APNG read
+        # them from each frame's info as they go.
+        params.setdefault('duration', frame_durations(image))
+
+    mode = frames_mode(image)
+    frames = (transform(frame.convert(mode)) for frame in iter_frames(image))
+    if format == 'PNG':
+        # The APNG writer goes over append_images twice.
+        frames = list(frames)
+        first = frames.pop(0)
+    else:
+        first = next(frames)
+    first.save(fp, format=format, save_all=True, append_images=frames, **params)
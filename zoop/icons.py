@@ -0,0 +1,31 @@
+import os
+import hashlib
+
+from PIL import Image
+
+from zoop.formats import ZOOP_ROOT
+
+ICON_CACHE_DIR = os.path.join(ZOOP_ROOT, 'cache', 'icons')
+ICON_SIZE = (90, 90)
+
+
+def scaled_icon_path(path, size=ICON_SIZE, cache_dir=ICON_CACHE_DIR):
+    # The source icons are up to 1024px wide, decoding and downscaling them
+    # for every message box is wasted work: they are scaled once to a small
+    # PNG that Tk can load on its own.
+    path = os.path.join(ZOOP_ROOT, path)
+    stat = os.stat(path)
+    key = '{}|{}|{}|{}x{}'.format(path, stat.st_mtime_ns, stat.st_size, size[0], size[1])
+    name = '{}_{}.png'.format(os.path.splitext(os.path.basename(path))[0], hashlib.sha1(key.encode('utf-8')).hexdigest()[:12])
+    scaled_path = os.path.join(cache_dir, name)
+
+    if not os.path.exists(scaled_path):
+        with Image.open(path) as image:
+            image = image.convert('RGBA').resize(size, Image.LANCZOS)
+
+        os.makedirs(cache_dir, exist_ok=True)
+        temp_path = scaled_path + '.tmp'
+        image.save(temp_path, format='PNG')
+        os.replace(temp_path, scaled_path)
+
+    return scaled_path
@@ -0,0 +1,51 @@
+class JobTable:
+    # Jobs get a stable integer id (their index in paths) which is also the
+    # iid used by the file list. Removing a job only flips its flag in the
+    # removed bitmap, so ids never shift and every operation stays O(1).
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.paths = []
+        self.removed = bytearray()
+        self.index = {}
+        self.live = 0
+
+    def __len__(self):
+        return self.live
+
+    def __contains__(self, path):
+        return path in self.index
+
+    def add(self, path):
+        if path in self.index:
+            return None
+
+        job_id = len(self.paths)
+        self.paths.append(path)
+        self.removed.append(0)
+        self.index[path] = job_id
+        self.live += 1
+        return job_id
+
+    def lookup(self, path):
+        return self.index.get(path)
+
+    def path(self, job_id):
+        return self.paths[job_id]
+
+    def remove(self, job_ids):
+        for job_id in job_ids:
+            job_id = int(job_id)
+            if not self.removed[job_id]:
+                self.removed[job_id] = 1
+                del self.index[self.paths[job_id]]
+                self.live -= 1
+
+    def live_paths(self):
+        removed = self.removed
+        return [path for job_id, path in enumerate(self.paths) if not removed[job_id]]
+
+    def select(self, job_ids):
+        removed = self.removed
+        return [self.paths[job_id] for job_id in map(int, job_ids) if not removed[job_id]]
@@ -0,0 +1,172 @@
+import os
+import time
+import pickle
+import sqlite3
+import threading
+
+from zoop.engine import ConversionJob
+from zoop.writer import TEMP_SUFFIX
+from zoop.formats import ZOOP_ROOT
+
+QUEUE_PATH = os.path.join(ZOOP_ROOT, 'cache', 'queue.sqlite3')
+COMMIT_EVERY = 200
+COMMIT_INTERVAL = 1.0
+
+PENDING = 0
+DONE = 1
+FAILED = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS batches (
+    id INTEGER PRIMARY KEY,
+    options BLOB NOT NULL,
+    settings BLOB NOT NULL,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    batch INTEGER NOT NULL REFERENCES batches(id),
+    source TEXT NOT NULL,
+    target TEXT NOT NULL,
+    state INTEGER NOT NULL DEFAULT 0,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_batch_state ON jobs (batch, state);
+"""
+
+
+class PendingBatch:
+    def __init__(self, id, settings, jobs):
+        self.id = id
+        self.settings = settings
+        self.jobs = jobs
+
+
+class JobStore:
+    # Every batch and the state of each of its jobs live in a small SQLite
+    # database so a batch cut short by a crash or by closing the window can
+    # be picked up where it stopped. WAL with synchronous=NORMAL keeps the
+    # per-result updates cheap, and they are only committed every
+    # COMMIT_EVERY results or COMMIT_INTERVAL seconds: losing the last few
+    # after a crash just means converting those files again.
+    def __init__(self, path=QUEUE_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._uncommitted = 0
+        self._last_commit = time.monotonic()
+
+    def add_batch(self, jobs, settings=None):
+        jobs = list(jobs)
+        options = jobs[0].options if jobs else {}
+        with self._lock:
+            if self._conn is None:
+                return None
+            self._commit()
+            self._conn.execute('BEGIN')
+            batch = self._conn.execute('INSERT INTO batches (options, settings, created) VALUES (?, ?, ?)',
+                                       (pickle.dumps(options), pickle.dumps(settings or {}), time.time())).lastrowid
+            for job in jobs:
+                job.queue_id = self._conn.execute('INSERT INTO jobs (batch, source, target) VALUES (?, ?, ?)',
+                                                  (batch, job.source, job.target)).lastrowid
+            self._conn.execute('COMMIT')
+        return batch
+
+    def record(self, result):
+        queue_id = result.job.queue_id
+        if queue_id is None:
+            return
+
+        with self._lock:
+            if self._conn is None:
+                return
+            if not self._uncommitted:
+                self._conn.execute('BEGIN')
+            self._conn.execute('UPDATE jobs SET state = ?, error = ? WHERE id = ?',
+                               (DONE if result.ok else FAILED, result.error, queue_id))
+            self._uncommitted += 1
+
+            if self._uncommitted >= COMMIT_EVERY or time.monotonic() - self._last_commit >= COMMIT_INTERVAL:
+                self._commit()
+
+    def flush(self):
+        with self._lock:
+            self._commit()
+
+    def finish_batch(self, batch):
+        with self._lock:
+            if self._conn is None:
+                return
+            self._commit()
+            self._conn.execute('BEGIN')
+            self._conn.execute('DELETE FROM jobs WHERE batch = ?', (batch,))
+            self._conn.execute('DELETE FROM batches WHERE id = ?', (batch,))
+            self._conn.execute('COMMIT')
+
+    def pending_counts(self):
+        # Pending jobs per batch, counted without loading them: cheap enough
+        # to ask at startup. Batches with nothing left are dropped.
+        with self._lock:
+            if self._conn is None:
+                return {}
+            counts = self._conn.execute('SELECT batches.id, COUNT(jobs.id) FROM batches '
+                                        'LEFT JOIN jobs ON jobs.batch = batches.id AND jobs.state = ? '
+                                        'GROUP BY batches.id ORDER BY batches.id', (PENDING,)).fetchall()
+
+        for batch, count in counts:
+            if not count:
+                self.finish_batch(batch)
+        return {batch: count for batch, count in counts if count}
+
+    def pending_batches(self, ids=None):
+        # Loads the pending jobs of the batches in `ids` (all of them when
+        # None) and removes the temp files their cut short writes left.
+        with self._lock:
+            if self._conn is None:
+                return []
+            batches = self._conn.execute('SELECT id, options, settings FROM batches ORDER BY id').fetchall()
+            pending = []
+            for batch, options, settings in batches:
+                if ids is not None and batch not in ids:
+                    continue
+                options = pickle.loads(options)
+                jobs = []
+                for queue_id, source, target in self._conn.execute(
+                        'SELECT id, source, target FROM jobs WHERE batch = ? AND state = ? ORDER BY id', (batch, PENDING)):
+                    job = ConversionJob(source, target, options)
+                    job.queue_id = queue_id
+                    jobs.append(job)
+                pending.append(PendingBatch(batch, pickle.loads(settings), jobs))
+
+        for batch in [batch for batch in pending if not batch.jobs]:
+            self.finish_batch(batch.id)
+        pending = [batch for batch in pending if batch.jobs]
+
+        for batch in pending:
+            # A write that was cut short leaves its temp file behind, the
+            # target itself is only ever replaced once complete.
+            for job in batch.jobs:
+                try:
+                    os.remove(job.target + TEMP_SUFFIX)
+                except OSError:
+                    pass
+
+        return pending
+
+    def close(self):
+        with self._lock:
+            if self._conn is None:
+                return
+            self._commit()
+            self._conn.close()
+            self._conn = None
+
+    def _commit(self):
+        if self._uncommitted:
+            self._conn.execute('COMMIT')
+            self._uncommitted = 0
+        self._last_commit = time.monotonic()
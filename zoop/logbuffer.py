@@ -0,0 +1,69 @@
+import os
+import logging
+from logging.handlers import RotatingFileHandler
+
+from zoop.formats import ZOOP_ROOT
+
+LOG_CAPACITY = 10000
+LOG_FILE = os.path.join(ZOOP_ROOT, 'logs', 'zoop.log')
+LOG_FILE_MAX_BYTES = 5 * 1024 * 1024
+LOG_FILE_BACKUPS = 5
+
+
+def file_logger(path=LOG_FILE, max_bytes=LOG_FILE_MAX_BYTES, backups=LOG_FILE_BACKUPS):
+    # Raises OSError when the log file can't be created. It is opened right
+    # away so that happens here rather than on every logged line.
+    logger = logging.getLogger('zoop.log.' + os.path.abspath(path))
+    if not logger.handlers:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    return logger
+
+
+class LogBuffer:
+    # Fixed size ring of (text, color) lines: once full the oldest lines are
+    # overwritten, so memory stays flat however long a batch runs. Every line
+    # still reaches the rotating log file when one is given.
+    def __init__(self, capacity=LOG_CAPACITY, logger=None):
+        self.capacity = max(int(capacity), 1)
+        self.logger = logger
+        self.total = 0
+        self._items = [None] * self.capacity
+        self._start = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError('log line out of range')
+        return self._items[(self._start + index) % self.capacity]
+
+    @property
+    def dropped(self):
+        return self.total - self._count
+
+    def append(self, text, color='black'):
+        for line in text.split('\n'):
+            if self._count < self.capacity:
+                self._items[(self._start + self._count) % self.capacity] = (line, color)
+                self._count += 1
+            else:
+                self._items[self._start] = (line, color)
+                self._start = (self._start + 1) % self.capacity
+            self.total += 1
+
+        if self.logger is not None:
+            self.logger.info(text)
+
+    def clear(self):
+        self._items = [None] * self.capacity
+        self._start = 0
+        self._count = 0
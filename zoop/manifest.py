@@ -0,0 +1,97 @@
+import os
+import json
+
+from zoop.hashing import file_digest
+
+MANIFEST_NAME = '.zoop-manifest.json'
+MANIFEST_VERSION = 1
+
+
+class Manifest:
+    # Remembers, per source file, what it looked like and which settings it
+    # was converted with the last time, so unchanged jobs can be skipped
+    # with a single stat() instead of a decode/encode round trip.
+    def __init__(self, output_dir):
+        self.path = os.path.join(output_dir, MANIFEST_NAME)
+        self.entries = {}
+        self.dirty = False
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+
+        if data.get('version') == MANIFEST_VERSION:
+            self.entries = data.get('entries', {})
+
+    def save(self):
+        if not self.dirty:
+            return
+
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump({'version': MANIFEST_VERSION, 'entries': self.entries}, f)
+        os.replace(temp_path, self.path)
+        self.dirty = False
+
+    def is_up_to_date(self, job):
+        entry = self.entries.get(os.path.abspath(job.source))
+        if entry is None or entry['target'] != job.target or entry['options'] != job.options:
+            return False
+
+        try:
+            stat = os.stat(job.source)
+            # Extracted frames are written next to the target, not to it.
+            if not all(os.path.exists(path) for path in entry.get('outputs') or [job.target]):
+                return False
+        except OSError:
+            return False
+
+        if stat.st_size != entry['size']:
+            return False
+        if stat.st_mtime_ns == entry['mtime_ns']:
+            return True
+
+        # Touched but maybe not modified (copied back, checked out again...):
+        # only then is the content hash worth reading the file for.
+        try:
+            digest = file_digest(job.source)
+        except OSError:
+            return False
+
+        if digest != entry['hash']:
+            return False
+
+        entry['mtime_ns'] = stat.st_mtime_ns
+        self.dirty = True
+        return True
+
+    def partition(self, jobs):
+        pending = []
+        skipped = []
+        for job in jobs:
+            if self.is_up_to_date(job):
+                skipped.append(job)
+            else:
+                job.fingerprint = True
+                pending.append(job)
+        return pending, skipped
+
+    def record(self, result):
+        if not result.ok or result.fingerprint is None:
+            return
+
+        size, mtime_ns, digest = result.fingerprint
+        self.entries[os.path.abspath(result.source)] = {
+            'target': result.target,
+            'outputs': result.outputs,
+            'options': result.job.options,
+            'size': size,
+            'mtime_ns': mtime_ns,
+            'hash': digest,
+        }
+        self.dirty = True
@@ -0,0 +1,119 @@
+import os
+import threading
+import warnings
+
+from PIL import Image
+
+from zoop.resize import target_size
+
+DEFAULT_MAX_IMAGE_PIXELS = Image.MAX_IMAGE_PIXELS
+BOMB_POLICIES = ['error', 'warn', 'off']
+DEFAULT_BOMB_POLICY = 'error'
+JPEG_DRAFT_SCALES = (8, 4, 2)
+
+
+def physical_memory():
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def default_memory_budget():
+    total = physical_memory()
+    return total // 2 if total else None
+
+
+def bytes_per_pixel(mode):
+    # Pillow keeps every multi-band image at 4 bytes per pixel.
+    if mode in ('1', 'L', 'P'):
+        return 1
+    if mode.startswith('I;16'):
+        return 2
+    return 4
+
+
+def estimate_footprint(path, options=None):
+    # Header only: Image.open() reads the size and mode without decoding.
+    options = options or {}
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', Image.DecompressionBombWarning)
+        with Image.open(path) as image:
+            width, height = image.size
+            mode = image.mode
+            format = image.format
+
+    decoded = (width, height)
+    resize = options.get('resize')
+    if resize:
+        target = target_size((width, height), resize)
+        if format == 'JPEG':
+            for scale in JPEG_DRAFT_SCALES:
+                if width // scale >= target[0] and height // scale >= target[1]:
+                    decoded = (-(-width // scale), -(-height // scale))
+                    break
+    else:
+        target = decoded
+
+    pixel_bytes = bytes_per_pixel(mode)
+    decoded_bytes = decoded[0] * decoded[1] * pixel_bytes
+    target_bytes = target[0] * target[1] * pixel_bytes
+    # Decoded raster, the transformed copy and roughly one raster worth of
+    # encoder output held in memory before it is written.
+    return decoded_bytes + target_bytes + target_bytes // 2
+
+
+def apply_bomb_policy(policy):
+    # Images over the limit are reported through bomb_warning() instead.
+    warnings.simplefilter('ignore', Image.DecompressionBombWarning)
+
+    if policy == 'off':
+        Image.MAX_IMAGE_PIXELS = None
+    elif policy == 'warn':
+        # Pillow only raises past twice the limit: keep the warning threshold
+        # for reporting, but let anything through.
+        Image.MAX_IMAGE_PIXELS = None
+    else:
+        Image.MAX_IMAGE_PIXELS = DEFAULT_MAX_IMAGE_PIXELS
+
+
+def bomb_warning(image, policy):
+    pixels = image.width * image.height
+    if policy != 'off' and DEFAULT_MAX_IMAGE_PIXELS and pixels > DEFAULT_MAX_IMAGE_PIXELS:
+        return 'image has {} pixels, above the decompression bomb limit of {}'.format(pixels, DEFAULT_MAX_IMAGE_PIXELS)
+    return None
+
+
+def check_bomb(image, policy):
+    # Pillow itself only refuses images past twice the limit, 'error' refuses
+    # everything above it. Returns the warning for the other policies.
+    warning = bomb_warning(image, policy)
+    if warning and policy == 'error':
+        raise Image.DecompressionBombError(warning)
+    return warning
+
+
+class MemoryBudget:
+    # Admission control for jobs based on their estimated footprint. A job
+    # bigger than the whole budget is still admitted, but only on its own.
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = 0
+        self.running = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self, size):
+        with self._lock:
+            if self.running and self.used + size > self.limit:
+                return False
+            self.used += size
+            self.running += 1
+            return True
+
+    def release(self, size):
+        with self._lock:
+            self.used -= size
+            self.running -= 1
+
+    def is_oversized(self, size):
+        return size > self.limit
@@ -0,0 +1,122 @@
+import os
+import json
+import heapq
+import time
+
+from zoop.formats import ZOOP_ROOT
+
+METRICS_DIR = os.path.join(ZOOP_ROOT, 'logs')
+STAGES = ['hash', 'open', 'decode', 'transform', 'encode', 'write']
+FLUSH_INTERVAL = 1.0
+METRICS_FILE_BACKUPS = 20
+
+
+def default_metrics_path():
+    return os.path.join(METRICS_DIR, time.strftime('metrics-%Y%m%d-%H%M%S.jsonl'))
+
+
+def prune_metrics(directory=METRICS_DIR, keep=METRICS_FILE_BACKUPS):
+    # Every batch started from the window writes its own file: only the
+    # newest ones are kept, like the rotating log file. The timestamped
+    # names sort oldest first.
+    try:
+        names = sorted(name for name in os.listdir(directory) if name.startswith('metrics-') and name.endswith('.jsonl'))
+    except OSError:
+        return
+    for name in names[:max(len(names) - keep, 0)]:
+        try:
+            os.remove(os.path.join(directory, name))
+        except OSError:
+            pass
+
+
+class StageTimer:
+    def __init__(self):
+        self.timings = {}
+        self._last = time.perf_counter()
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        self.timings[stage] = self.timings.get(stage, 0.0) + now - self._last
+        self._last = now
+
+
+class MetricsSummary:
+    def __init__(self, slowest=20):
+        self.slowest_count = slowest
+        self.files = 0
+        self.failures = 0
+        self.elapsed = 0.0
+        self.input_bytes = 0
+        self.output_bytes = 0
+        self.attempts = 0
+        self.stages = {}
+        self._slowest = []
+
+    def add(self, result):
+        self.files += 1
+        self.failures += not result.ok
+        self.elapsed += result.elapsed
+        self.input_bytes += result.input_bytes
+        self.output_bytes += result.output_bytes
+        self.attempts += result.attempts
+
+        for stage, seconds in result.timings.items():
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+        entry = (result.elapsed, result.source, dict(result.timings))
+        if len(self._slowest) < self.slowest_count:
+            heapq.heappush(self._slowest, entry)
+        else:
+            heapq.heappushpop(self._slowest, entry)
+
+    def slowest(self):
+        return sorted(self._slowest, reverse=True)
+
+    def stage_table(self):
+        rows = []
+        for stage in STAGES:
+            if stage in self.stages:
+                total = self.stages[stage]
+                share = total / self.elapsed if self.elapsed else 0.0
+                rows.append((stage, total, total / self.files if self.files else 0.0, share))
+        return rows
+
+    def as_dict(self):
+        return {
+            'files': self.files,
+            'failures': self.failures,
+            'elapsed': round(self.elapsed, 6),
+            'input_bytes': self.input_bytes,
+            'output_bytes': self.output_bytes,
+            'attempts': self.attempts,
+            'stages': {stage: round(total, 6) for stage, total in self.stages.items()},
+            'slowest': [{'source': source, 'elapsed': round(elapsed, 6)} for elapsed, source, _ in self.slowest()],
+        }
+
+
+class MetricsSink:
+    # One JSON object per converted file, flushed at least every
+    # FLUSH_INTERVAL seconds so the file can be tailed or loaded while a
+    # long batch is still running.
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._file = open(path, 'a', encoding='utf-8')
+        self.summary = MetricsSummary()
+        self._last_flush = time.monotonic()
+
+    def record(self, result):
+        self.summary.add(result)
+        line = result.as_dict()
+        line['time'] = time.time()
+        self._file.write(json.dumps(line) + '\n')
+        if time.monotonic() - self._last_flush >= FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        self._file.flush()
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        self._file.close()
@@ -0,0 +1,126 @@
+import io
+
+from PIL import Image, ImageColor
+
+try:
+    from PIL import ImageCms
+except ImportError:
+    ImageCms = None
+
+DEFAULT_BACKGROUND = '#ffffff'
+ICC_POLICIES = ['keep', 'srgb', 'strip']
+DEFAULT_ICC_POLICY = 'keep'
+
+# Modes each encoder writes as is, anything else is converted first.
+TARGET_MODES = {
+    'JPEG': ('RGB', 'L', 'CMYK'),
+    'BMP': ('RGB', 'L', 'P', '1'),
+    'WEBP': ('RGB', 'RGBA'),
+    'PNG': ('RGB', 'RGBA', 'L', 'LA', 'P', '1', 'I;16'),
+    'GIF': ('RGB', 'RGBA', 'L', 'P', '1'),
+    'ICO': ('RGB', 'RGBA'),
+}
+ALPHA_MODES = ('RGBA', 'LA', 'PA', 'RGBa', 'La')
+GREY_MODES = ('1', 'L', 'LA', 'La', 'I', 'I;16', 'I;16B', 'I;16L', 'F')
+HIGH_DEPTH_MODES = ('I', 'I;16', 'I;16B', 'I;16L', 'F')
+# Premultiplied alpha, Pillow only converts these to their plain version.
+PREMULTIPLIED_MODES = {'La': 'LA', 'RGBa': 'RGBA'}
+ICC_FORMATS = ('JPEG', 'PNG', 'WEBP')
+
+
+def parse_background(value):
+    # Kept as a '#rrggbb' string so job options stay JSON friendly.
+    try:
+        return '#{:02x}{:02x}{:02x}'.format(*ImageColor.getrgb(str(value).strip())[:3])
+    except ValueError:
+        raise ValueError('invalid background colour {!r}'.format(value))
+
+
+def has_alpha(image):
+    return image.mode in ALPHA_MODES or 'transparency' in image.info
+
+
+def colour_space(mode):
+    if mode in GREY_MODES:
+        return 'grey'
+    if mode == 'CMYK':
+        return 'cmyk'
+    return 'rgb'
+
+
+def to_8bit(image):
+    # 16 bit and float greyscale (scans, PNG 16, TIFF) scaled down to L.
+    if image.mode == 'F':
+        return image.convert('L')
+    if image.mode != 'I':
+        image = image.convert('I')
+    return image.point(lambda value: value / 256).convert('L')
+
+
+def to_16bit(image):
+    # 32 bit integer greyscale is clamped to 0-65535, Pillow deprecates
+    # writing it as is.
+    return image.convert('I;16')
+
+
+def to_srgb(image, profile):
+    # Needs littlecms, without it the pixels are left as they are.
+    if ImageCms is None:
+        return image
+
+    mode = 'RGBA' if has_alpha(image) else 'RGB'
+    if image.mode not in ('RGB', 'RGBA', 'CMYK', 'L'):
+        image = image.convert(mode)
+    try:
+        source = ImageCms.ImageCmsProfile(io.BytesIO(profile))
+        return ImageCms.profileToProfile(image, source, ImageCms.createProfile('sRGB'), outputMode=mode)
+    except (OSError, ValueError, ImageCms.PyCMSError):
+        return image
+
+
+def flatten(image, background):
+    # The whole image is composited over the background colour at once,
+    # its alpha band being the paste mask.
+    if image.mode != 'RGBA':
+        image = image.convert('RGBA')
+    flat = Image.new('RGB', image.size, ImageColor.getrgb(background)[:3])
+    flat.paste(image, mask=image.getchannel('A'))
+    return flat
+
+
+def normalize_image(image, format, options=None):
+    # Returns the image in a mode the target encoder writes and the ICC
+    # profile that should be embedded with it, if any.
+    options = options or {}
+    policy = options.get('icc', DEFAULT_ICC_POLICY)
+    profile = image.info.get('icc_profile')
+    source_space = colour_space(image.mode)
+
+    if image.mode in PREMULTIPLIED_MODES:
+        image = image.convert(PREMULTIPLIED_MODES[image.mode])
+
+    if policy == 'srgb' and profile:
+        image = to_srgb(image, profile)
+        profile = None
+        source_space = colour_space(image.mode)
+
+    accepted = TARGET_MODES.get(format)
+    if accepted is not None:
+        if image.mode in HIGH_DEPTH_MODES and image.mode not in accepted:
+            image = to_16bit(image) if 'I;16' in accepted and image.mode != 'F' else to_8bit(image)
+
+        if has_alpha(image) and 'RGBA' not in accepted:
+            image = flatten(image, options.get('background', DEFAULT_BACKGROUND))
+        elif image.mode not in accepted:
+            if image.mode == 'CMYK' and profile:
+                image = to_srgb(image, profile)
+            if has_alpha(image):
+                image = image.convert('RGBA')
+            elif image.mode == '1' and 'L' in accepted:
+                image = image.convert('L')
+            elif image.mode not in accepted:
+                image = image.convert('RGB')
+
+    if policy != 'keep' or format not in ICC_FORMATS or colour_space(image.mode) != source_space:
+        profile = None
+    return image, profile
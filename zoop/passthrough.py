@@ -0,0 +1,146 @@
+import os
+import shutil
+import struct
+
+from PIL import Image
+
+from zoop.frames import is_multiframe
+from zoop.modes import TARGET_MODES
+from zoop.probe import FORMAT_ALIASES
+from zoop.writer import COPY_CHUNK, DEFAULT_FSYNC, atomic_output, link_or_copy
+
+SAME_FORMAT_MODES = ['reencode', 'copy', 'link']
+DEFAULT_SAME_FORMAT = 'copy'
+METADATA_POLICIES = ['keep', 'strip']
+DEFAULT_METADATA = 'keep'
+
+ORIENTATION_TAG = 0x0112
+
+SOI = b'\xff\xd8'
+SOS = 0xda
+APP0 = 0xe0
+APP2 = 0xe2
+APP14 = 0xee
+COM = 0xfe
+# Markers without a length field.
+STANDALONE_MARKERS = {0x01} | set(range(0xd0, 0xd8))
+
+
+def passthrough_mode(image, format, options):
+    # How the source can be turned into the target without decoding it:
+    # 'copy'/'link' for the file as is, 'jpeg' when only JPEG segments have
+    # to be dropped, None when the pixels are needed.
+    mode = options.get('same_format', DEFAULT_SAME_FORMAT)
+    if mode == 'reencode' or FORMAT_ALIASES.get(image.format, image.format) != format:
+        return None
+    if options.get('resize') or options.get('target_size') or options.get('save'):
+        return None
+    if image.mode not in TARGET_MODES.get(format, (image.mode,)):
+        return None
+    if options.get('frames') not in (None, 'animate') and is_multiframe(image):
+        return None
+
+    has_profile = bool(image.info.get('icc_profile'))
+    icc = options.get('icc', 'keep')
+    strip_metadata = options.get('metadata', DEFAULT_METADATA) == 'strip'
+    if icc == 'srgb' and has_profile:
+        return None
+    if strip_metadata or (icc == 'strip' and has_profile):
+        # Only JPEG segments are rewritten here, MPO trailing images would
+        # lose their index.
+        return 'jpeg' if image.format == 'JPEG' else None
+    return mode
+
+
+def orientation_segment(orientation):
+    exif = Image.Exif()
+    exif[ORIENTATION_TAG] = orientation
+    data = exif.tobytes()
+    return b'\xff\xe1' + struct.pack('>H', len(data) + 2) + data
+
+
+def keep_segment(marker, payload, strip_metadata, keep_icc):
+    if marker == APP2 and payload.startswith(b'ICC_PROFILE\0'):
+        return keep_icc
+    if not strip_metadata:
+        return True
+    if marker == APP0:
+        return payload.startswith(b'JFIF\0')
+    if marker == APP14:
+        # Adobe segment, tells decoders how the colour channels are stored.
+        return payload.startswith(b'Adobe')
+    return not (0xe0 <= marker <= 0xef or marker == COM)
+
+
+def rewrite_jpeg(source, f, strip_metadata=True, keep_icc=True, orientation=None):
+    # Copies the JPEG segment by segment, leaving out the metadata ones, and
+    # the entropy coded data after the scan header byte for byte: the
+    # pixels are never decoded. With the metadata stripped, a minimal EXIF
+    # block keeps the orientation so the image still displays upright.
+    with open(source, 'rb') as src:
+        if src.read(2) != SOI:
+            raise ValueError('not a JPEG file')
+        f.write(SOI)
+        exif = orientation_segment(orientation) if strip_metadata and orientation not in (None, 1) else None
+
+        while True:
+            prefix = src.read(1)
+            if prefix != b'\xff':
+                raise ValueError('corrupt JPEG segment')
+            marker = src.read(1)
+            while marker == b'\xff':
+                marker = src.read(1)
+            if not marker:
+                raise ValueError('truncated JPEG file')
+            marker = marker[0]
+
+            if marker in STANDALONE_MARKERS:
+                f.write(b'\xff' + bytes([marker]))
+                continue
+
+            length = src.read(2)
+            if len(length) != 2:
+                raise ValueError('truncated JPEG file')
+            payload = src.read(struct.unpack('>H', length)[0] - 2)
+
+            # JFIF requires its APP0 segment right after SOI.
+            if exif is not None and marker != APP0:
+                f.write(exif)
+                exif = None
+
+            if keep_segment(marker, payload, strip_metadata, keep_icc):
+                f.write(b'\xff' + bytes([marker]) + length + payload)
+
+            if marker == SOS:
+                shutil.copyfileobj(src, f, COPY_CHUNK)
+                return f.tell()
+
+
+class PassThrough:
+    # An output made straight from the source file. Workers send it back to
+    # the output writer instead of bytes, the copy, link or rewrite then
+    # happens on the writer threads like any other write.
+    def __init__(self, source, mode, strip_metadata=False, keep_icc=True, orientation=None):
+        self.source = source
+        self.mode = mode
+        self.strip_metadata = strip_metadata
+        self.keep_icc = keep_icc
+        self.orientation = orientation
+        self.size = os.path.getsize(source)
+
+    def write(self, target, fsync=DEFAULT_FSYNC):
+        # Returns the number of bytes written.
+        if self.mode == 'jpeg':
+            with atomic_output(target, fsync) as f:
+                return rewrite_jpeg(self.source, f, self.strip_metadata, self.keep_icc, self.orientation)
+        link_or_copy(self.source, target, self.mode, fsync)
+        return os.path.getsize(target)
+
+
+def pass_through(image, source, mode, options):
+    if mode != 'jpeg':
+        return PassThrough(source, mode)
+    strip_metadata = options.get('metadata', DEFAULT_METADATA) == 'strip'
+    keep_icc = options.get('icc', 'keep') != 'strip'
+    orientation = image.getexif().get(ORIENTATION_TAG) if strip_metadata else None
+    return PassThrough(source, mode, strip_metadata, keep_icc, orientation)
@@ -0,0 +1,207 @@
+import os
+import queue
+import struct
+import threading
+import warnings
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from zoop.formats import format_for_ext
+from zoop.memory import DEFAULT_BOMB_POLICY, bomb_warning
+
+PROBE_WORKERS = 4
+
+# Formats Pillow reports for files that are still fine under another name.
+FORMAT_ALIASES = {
+    'MPO': 'JPEG',
+}
+
+class ImageInfo:
+    __slots__ = ('format', 'size', 'mode', 'frames', 'file_size', 'mtime_ns', 'error', 'warning')
+
+    def __init__(self, format=None, size=(0, 0), mode=None, frames=1, file_size=0, mtime_ns=0, error=None, warning=None):
+        self.format = format
+        self.size = size
+        self.mode = mode
+        self.frames = frames
+        self.file_size = file_size
+        self.mtime_ns = mtime_ns
+        self.error = error
+        self.warning = warning
+
+    @property
+    def pixels(self):
+        return self.size[0] * self.size[1] * self.frames
+
+    @property
+    def cost(self):
+        # Rough amount of work to convert the file, used to schedule big
+        # files first. Unreadable files cost nothing, they fail right away.
+        if self.error is not None:
+            return 0
+        return self.pixels or self.file_size
+
+    def is_mislabeled(self, path):
+        expected = format_for_ext(os.path.splitext(path)[1])
+        if self.format is None or expected is None:
+            return False
+        return FORMAT_ALIASES.get(self.format, self.format) != expected
+
+
+def open_plugin(path):
+    # What Image.open does, minus its decompression bomb check: the format
+    # plugins only parse the header when they are created.
+    with open(path, 'rb') as f:
+        prefix = f.read(16)
+    Image.init()
+    for format_id in Image.ID:
+        factory, accept = Image.OPEN[format_id]
+        result = not accept or accept(prefix)
+        if not result or isinstance(result, str):
+            continue
+        try:
+            return factory(path)
+        except (SyntaxError, IndexError, TypeError, struct.error):
+            continue
+    raise Image.UnidentifiedImageError('cannot identify image file {!r}'.format(path))
+
+
+def open_header(path):
+    # Past twice the decompression bomb limit Image.open refuses the file
+    # before reading anything else. Nothing is decoded here, so the header
+    # is parsed again by the format plugin directly, leaving the global
+    # limit alone: huge scans keep their size and are still scheduled first.
+    try:
+        return Image.open(path)
+    except Image.DecompressionBombError:
+        return open_plugin(path)
+
+
+def probe_image(path):
+    # Image.open only parses the header, nothing is decoded as long as
+    # load() is never called. n_frames walks the frame headers of animated
+    # files without decoding them either.
+    try:
+        stat = os.stat(path)
+    except OSError as e:
+        return ImageInfo(error='{}: {}'.format(type(e).__name__, e))
+
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', Image.DecompressionBombWarning)
+            with open_header(path) as image:
+                return ImageInfo(image.format, image.size, image.mode, getattr(image, 'n_frames', 1),
+                                 stat.st_size, stat.st_mtime_ns, warning=bomb_warning(image, DEFAULT_BOMB_POLICY))
+    except Exception as e:
+        return ImageInfo(file_size=stat.st_size, mtime_ns=stat.st_mtime_ns, error='{}: {}'.format(type(e).__name__, e))
+
+
+class ProbeCache:
+    def __init__(self, workers=PROBE_WORKERS):
+        self.workers = workers
+        self._entries = {}
+        self._queued = set()
+        self._completed = deque()
+        self._queue = queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def get(self, path):
+        # Entries stay valid as long as the file keeps its mtime and size.
+        info = self._entries.get(path)
+        if info is None:
+            return None
+
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return info
+
+        if stat.st_mtime_ns != info.mtime_ns or stat.st_size != info.file_size:
+            return None
+        return info
+
+    def probe(self, path):
+        info = self.get(path)
+        if info is None:
+            info = probe_image(path)
+            self._entries[path] = info
+        return info
+
+    def request(self, paths):
+        self._start()
+        with self._lock:
+            for path in paths:
+                if path not in self._queued:
+                    self._queued.add(path)
+                    self._queue.put(path)
+
+    def lookup(self, path):
+        info = self.get(path)
+        if info is None:
+            self.request([path])
+        return info
+
+    def drain(self, limit=500):
+        completed = []
+        while self._completed and len(completed) < limit:
+            completed.append(self._completed.popleft())
+        return completed
+
+    @property
+    def pending(self):
+        return len(self._queued)
+
+    def close(self):
+        self._closed = True
+        for _ in self._threads:
+            self._queue.put(None)
+
+    def _start(self):
+        if self._threads or self._closed:
+            return
+
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name='zoop-probe-{}'.format(i), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _work(self):
+        while not self._closed:
+            path = self._queue.get()
+            if path is None:
+                return
+
+            info = probe_image(path)
+            with self._lock:
+                self._entries[path] = info
+                self._queued.discard(path)
+                self._completed.append((path, info))
+
+
+def schedule_jobs(jobs, probes=None, workers=PROBE_WORKERS, cancel_event=None, progress=None):
+    # Longest jobs first: the pool then finishes with a tail of small files
+    # instead of one worker still chewing on a huge one while the rest idle.
+    # progress(done, total) is called after every probe; once cancel_event
+    # is set the jobs are returned as they came.
+    jobs = list(jobs)
+    probe = probes.probe if probes is not None else probe_image
+    costs = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(probe, job.source) for job in jobs]
+        try:
+            for future in futures:
+                if cancel_event is not None and cancel_event.is_set():
+                    return jobs
+                costs.append(future.result().cost)
+                if progress is not None:
+                    progress(len(costs), len(futures))
+        finally:
+            for future in futures:
+                future.cancel()
+
+    order = sorted(range(len(jobs)), key=costs.__getitem__, reverse=True)
+    return [jobs[i] for i in order]
@@ -0,0 +1,38 @@
+from zoop.formats import format_for_ext
+
+DEFAULT_PROFILE = 'default'
+PROFILE_NAMES = ['default', 'fast', 'balanced', 'smallest']
+
+# Save parameters handed to Pillow for each output format. 'default' keeps
+# Pillow's own defaults, the others trade encoder CPU time for output bytes.
+ENCODING_PROFILES = {
+    'JPEG': {
+        'default': {},
+        'fast': {'quality': 80, 'optimize': False, 'progressive': False, 'subsampling': '4:2:0'},
+        'balanced': {'quality': 85, 'optimize': True, 'progressive': False, 'subsampling': '4:2:0'},
+        'smallest': {'quality': 75, 'optimize': True, 'progressive': True, 'subsampling': '4:2:0'},
+    },
+    'WEBP': {
+        'default': {},
+        'fast': {'quality': 80, 'method': 0},
+        'balanced': {'quality': 80, 'method': 4},
+        'smallest': {'quality': 75, 'method': 6},
+    },
+    'PNG': {
+        'default': {},
+        'fast': {'compress_level': 1},
+        'balanced': {'compress_level': 6},
+        'smallest': {'optimize': True},
+    },
+    'GIF': {
+        'default': {},
+        'fast': {'optimize': False},
+        'balanced': {'optimize': False},
+        'smallest': {'optimize': True},
+    },
+}
+
+
+def save_options(ext, profile=DEFAULT_PROFILE):
+    profiles = ENCODING_PROFILES.get(format_for_ext(ext), {})
+    return dict(profiles.get(profile, {}))
@@ -0,0 +1,90 @@
+from PIL import Image
+
+RESIZE_MODES = ['none', 'max', 'exact', 'scale']
+DEFAULT_FILTER = 'lanczos'
+
+RESAMPLING_FILTERS = {
+    'nearest': Image.NEAREST,
+    'box': Image.BOX,
+    'bilinear': Image.BILINEAR,
+    'hamming': Image.HAMMING,
+    'bicubic': Image.BICUBIC,
+    'lanczos': Image.LANCZOS,
+}
+
+# reduce() is only used down to twice the target size so the final
+# resampling filter still has enough pixels to work with.
+REDUCING_GAP = 2
+
+
+def parse_resize(mode, value, resample=DEFAULT_FILTER):
+    if mode in (None, '', 'none'):
+        return None
+
+    if resample not in RESAMPLING_FILTERS:
+        raise ValueError('unknown resampling filter {!r}'.format(resample))
+
+    value = str(value).strip().lower()
+    try:
+        if mode == 'max':
+            options = {'mode': 'max', 'max': int(value)}
+            valid = options['max'] > 0
+        elif mode == 'exact':
+            width, height = value.split('x')
+            options = {'mode': 'exact', 'width': int(width), 'height': int(height)}
+            valid = options['width'] > 0 and options['height'] > 0
+        elif mode == 'scale':
+            options = {'mode': 'scale', 'scale': float(value)}
+            valid = options['scale'] > 0
+        else:
+            raise ValueError('unknown resize mode {!r}'.format(mode))
+    except ValueError:
+        raise ValueError('invalid {} resize value {!r}'.format(mode, value))
+
+    if not valid:
+        raise ValueError('invalid {} resize value {!r}'.format(mode, value))
+
+    options['filter'] = resample
+    return options
+
+
+def target_size(size, options):
+    width, height = size
+    mode = options['mode']
+
+    if mode == 'exact':
+        return (options['width'], options['height'])
+
+    if mode == 'max':
+        factor = min(options['max'] / max(width, height), 1.0)
+    else:
+        factor = options['scale']
+
+    return (max(int(round(width * factor)), 1), max(int(round(height * factor)), 1))
+
+
+def prepare_resize(image, options):
+    # Has to happen before anything loads the image: JPEG can then decode
+    # at 1/2, 1/4 or 1/8 scale straight away.
+    size = target_size(image.size, options)
+    if image.format == 'JPEG' and size[0] < image.width and size[1] < image.height:
+        image.draft(image.mode, size)
+    return size
+
+
+def resize_image(image, options, size=None):
+    if size is None:
+        size = prepare_resize(image, options)
+    if size == image.size:
+        return image
+
+    if image.mode == 'P':
+        image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+    elif image.mode == '1':
+        image = image.convert('L')
+
+    factor = min(image.width // size[0], image.height // size[1]) // REDUCING_GAP
+    if factor > 1:
+        image = image.reduce(factor)
+
+    return image.resize(size, RESAMPLING_FILTERS[options['filter']])
@@ -0,0 +1,56 @@
+import os
+import glob
+
+from zoop.formats import is_supported
+
+
+def iter_directory(directory, recursive=True):
+    # Depth-first walk that only ever holds one directory handle open and
+    # yields paths as soon as they are read, so callers can start consuming
+    # huge trees straight away.
+    stack = [directory]
+    while stack:
+        current = stack.pop()
+        subdirs = []
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.path)
+                        elif is_supported(entry.name) and entry.is_file():
+                            yield entry.path
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+
+        if recursive:
+            subdirs.sort(reverse=True)
+            stack.extend(subdirs)
+
+
+def iter_sources(inputs, unmatched=None):
+    # Patterns that match no file at all are appended to `unmatched`.
+    seen = set()
+    for entry in inputs:
+        if os.path.isdir(entry):
+            paths = iter_directory(entry)
+        elif glob.has_magic(entry):
+            paths = sorted(glob.glob(entry, recursive=True))
+            if not paths and unmatched is not None:
+                unmatched.append(entry)
+        else:
+            paths = [entry]
+
+        for path in paths:
+            if os.path.isdir(path):
+                candidates = iter_directory(path)
+            else:
+                candidates = [path] if is_supported(path) else []
+
+            for candidate in candidates:
+                key = os.path.abspath(candidate)
+                if key not in seen:
+                    seen.add(key)
+                    yield candidate
@@ -0,0 +1,66 @@
+import io
+
+TARGET_SIZE_FORMATS = ('JPEG', 'WEBP')
+DEFAULT_TOLERANCE = 0.05
+MIN_QUALITY = 5
+MAX_QUALITY = 95
+
+
+def parse_target_size(value, tolerance=DEFAULT_TOLERANCE):
+    # value is in KB, an empty value disables the target.
+    value = str(value).strip().lower()
+    if value in ('', '0', 'none'):
+        return None
+    try:
+        kilobytes = float(value[:-2] if value.endswith('kb') else value.rstrip('k'))
+    except ValueError:
+        raise ValueError('invalid target size {!r}'.format(value))
+    if kilobytes <= 0:
+        raise ValueError('invalid target size {!r}'.format(value))
+    return {'bytes': int(kilobytes * 1024), 'tolerance': tolerance}
+
+
+def encode_attempt(image, format, params, quality):
+    buffer = io.BytesIO()
+    image.save(buffer, format=format, **dict(params, quality=quality))
+    return buffer
+
+
+def encode_to_size(image, format, params, target):
+    # Binary search on the encoder quality, every attempt encodes the same
+    # decoded image into memory. The search stops as soon as an output fits
+    # and is within `tolerance` of the budget. Returns the buffer, the
+    # quality used, the number of attempts and whether the budget was met.
+    max_bytes = target['bytes']
+    low_enough = max_bytes * (1 - target.get('tolerance', DEFAULT_TOLERANCE))
+    params = dict(params)
+    if format == 'WEBP':
+        params['lossless'] = False
+
+    # The profile quality is the ceiling, a file that already fits at it is
+    # not made any bigger.
+    high = min(params.pop('quality', MAX_QUALITY), MAX_QUALITY)
+    buffer = encode_attempt(image, format, params, high)
+    attempts = 1
+    if buffer.tell() <= max_bytes:
+        return buffer, high, attempts, True
+
+    best = None
+    smallest = (high, buffer)
+    low, high = MIN_QUALITY, high - 1
+    while low <= high:
+        quality = (low + high) // 2
+        buffer = encode_attempt(image, format, params, quality)
+        attempts += 1
+        if buffer.tell() <= max_bytes:
+            best = (quality, buffer)
+            if buffer.tell() >= low_enough:
+                break
+            low = quality + 1
+        else:
+            smallest = (quality, buffer)
+            high = quality - 1
+
+    if best is None:
+        return smallest[1], smallest[0], attempts, False
+    return best[1], best[0], attempts, True
@@ -0,0 +1,127 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from zoop.formats import ZOOP_ROOT
+
+THUMBNAIL_CACHE_DIR = os.path.join(ZOOP_ROOT, 'cache', 'thumbnails')
+THUMBNAIL_SIZE = (160, 160)
+THUMBNAIL_MEMORY_BUDGET = 32 * 1024 * 1024
+
+
+def cache_key(path, size):
+    stat = os.stat(path)
+    return '{}|{}|{}|{}x{}'.format(os.path.abspath(path), stat.st_mtime_ns, stat.st_size, size[0], size[1])
+
+
+def make_thumbnail(path, size):
+    with Image.open(path) as image:
+        # JPEG can decode straight at 1/2, 1/4 or 1/8 scale, everything else
+        # goes through reduce() inside thumbnail() before the final resample.
+        if image.format == 'JPEG':
+            image.draft('RGB', (size[0] * 2, size[1] * 2))
+
+        image.thumbnail(size, Image.LANCZOS, reducing_gap=2.0)
+
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.mode or 'transparency' in image.info else 'RGB')
+        else:
+            image.load()
+
+        return image
+
+
+def image_bytes(image):
+    return image.width * image.height * len(image.getbands())
+
+
+class ThumbnailCache:
+    def __init__(self, size=THUMBNAIL_SIZE, memory_budget=THUMBNAIL_MEMORY_BUDGET, cache_dir=THUMBNAIL_CACHE_DIR, workers=2):
+        self.size = size
+        self.memory_budget = memory_budget
+        self.cache_dir = cache_dir
+        self.memory_used = 0
+        self._entries = OrderedDict()
+        self._pending = {}
+        self._errors = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='zoop-thumbnails')
+
+    def lookup(self, path):
+        try:
+            key = cache_key(path, self.size)
+        except OSError:
+            return None
+
+        with self._lock:
+            image = self._entries.get(key)
+            if image is not None:
+                self._entries.move_to_end(key)
+                return image
+
+            if key not in self._pending and key not in self._errors:
+                self._pending[key] = self._executor.submit(self._generate, path, key)
+
+        return None
+
+    def error(self, path):
+        try:
+            key = cache_key(path, self.size)
+        except OSError as e:
+            return str(e)
+
+        return self._errors.get(key)
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.png')
+
+    def _generate(self, path, key):
+        try:
+            disk_path = self._disk_path(key) if self.cache_dir else None
+            image = None
+
+            if disk_path is not None and os.path.exists(disk_path):
+                try:
+                    with Image.open(disk_path) as cached:
+                        cached.load()
+                        image = cached.copy()
+                except OSError:
+                    image = None
+
+            if image is None:
+                image = make_thumbnail(path, self.size)
+                if disk_path is not None:
+                    self._write_disk(image, disk_path)
+
+            self._store(key, image)
+        except Exception as e:
+            self._errors[key] = '{}: {}'.format(type(e).__name__, e)
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    def _write_disk(self, image, disk_path):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            temp_path = disk_path + '.tmp'
+            image.save(temp_path, format='PNG')
+            os.replace(temp_path, disk_path)
+        except OSError:
+            pass
+
+    def _store(self, key, image):
+        size = image_bytes(image)
+        with self._lock:
+            self._entries[key] = image
+            self.memory_used += size
+
+            while self.memory_used > self.memory_budget and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self.memory_used -= image_bytes(evicted)
@@ -0,0 +1,43 @@
+import os
+
+
+def source_root(sources):
+    # Deepest folder all the sources share, their folders below it are
+    # recreated under the output directory. None when there is no common
+    # folder (different drives).
+    directories = {os.path.dirname(os.path.abspath(source)) for source in sources}
+    if not directories:
+        return None
+    try:
+        return os.path.commonpath(list(directories))
+    except ValueError:
+        return None
+
+
+def prepare_directories(jobs, created=None):
+    # Every output folder is created once before the conversion starts
+    # instead of being checked for each file. Only the deepest folders are
+    # passed to makedirs, which creates their parents along the way.
+    # `created` is updated with the folders made, so repeated calls (watch
+    # mode) skip them.
+    created = created if created is not None else set()
+    directories = sorted({os.path.dirname(os.path.abspath(job.target)) for job in jobs} - created, reverse=True)
+
+    leaf = None
+    for directory in directories:
+        # Sorted in reverse, a parent comes right after its deepest child.
+        if leaf is not None and leaf.startswith(directory + os.sep):
+            continue
+        os.makedirs(directory, exist_ok=True)
+        leaf = directory
+
+    created.update(directories)
+    return created
+
+
+def group_by_directory(jobs):
+    # Jobs of the same source folder run back to back so reads (and the
+    # matching writes) stay within one folder at a time; the order inside a
+    # folder, e.g. largest first, is kept.
+    jobs = list(jobs)
+    return sorted(jobs, key=lambda job: os.path.dirname(os.path.abspath(job.source)))
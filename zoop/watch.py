@@ -0,0 +1,372 @@
+import os
+import sys
+import time
+import queue
+import select
+import struct
+import threading
+import ctypes
+import ctypes.util
+from collections import deque
+
+from zoop.dedup import resolve_collisions
+from zoop.engine import ConversionEngine, make_jobs
+from zoop.formats import is_supported
+from zoop.scan import iter_directory
+from zoop.tree import prepare_directories
+from zoop.writer import DEFAULT_FSYNC, DEFAULT_IO_WORKERS
+
+DEFAULT_SETTLE = 1.0
+DEFAULT_POLL_INTERVAL = 1.0
+THROUGHPUT_WINDOW = 60.0
+STATS_INTERVAL = 1.0
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+EVENT_HEADER = struct.Struct('iIII')
+
+
+def is_under(path, directory):
+    try:
+        return os.path.commonpath([os.path.abspath(path), os.path.abspath(directory)]) == os.path.abspath(directory)
+    except ValueError:
+        return False
+
+
+class PollingBackend:
+    # Portable fallback: the tree is rescanned every interval and compared
+    # with the previous snapshot.
+    def __init__(self, directory, recursive=True, interval=DEFAULT_POLL_INTERVAL):
+        self.directory = directory
+        self.recursive = recursive
+        self.interval = interval
+        self._snapshot = self._scan()
+        self._last_scan = time.monotonic()
+
+    def paths(self):
+        return list(self._snapshot)
+
+    def changes(self, timeout=0.0):
+        wait = self.interval - (time.monotonic() - self._last_scan)
+        if wait > timeout:
+            if timeout > 0:
+                time.sleep(timeout)
+            return []
+        if wait > 0:
+            time.sleep(wait)
+
+        snapshot = self._scan()
+        self._last_scan = time.monotonic()
+        changed = [path for path, state in snapshot.items() if self._snapshot.get(path) != state]
+        self._snapshot = snapshot
+        return changed
+
+    def close(self):
+        pass
+
+    def _scan(self):
+        snapshot = {}
+        for path in iter_directory(self.directory, self.recursive):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            snapshot[path] = (stat.st_size, stat.st_mtime_ns)
+        return snapshot
+
+
+class InotifyBackend:
+    # Linux only, through libc so there is nothing to install. Directories
+    # created later are watched as they appear.
+    def __init__(self, directory, recursive=True):
+        libc_name = ctypes.util.find_library('c') or 'libc.so.6'
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.directory = directory
+        self.recursive = recursive
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self._watches = {}
+        self._add_tree(directory)
+
+    def paths(self):
+        return list(iter_directory(self.directory, self.recursive))
+
+    def changes(self, timeout=0.0):
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return []
+
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        changed = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0').decode(sys.getfilesystemencoding(), 'surrogateescape')
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                # Events were dropped, only a full rescan is reliable.
+                changed.extend(self.paths())
+                continue
+
+            directory = self._watches.get(wd)
+            if directory is None:
+                continue
+            path = os.path.join(directory, name)
+            if mask & IN_ISDIR:
+                if self.recursive and mask & (IN_CREATE | IN_MOVED_TO):
+                    # Files may have landed before the watch was added.
+                    self._add_tree(path)
+                    changed.extend(iter_directory(path, True))
+            else:
+                changed.append(path)
+        return changed
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def _add_tree(self, directory):
+        stack = [directory]
+        while stack:
+            current = stack.pop()
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(current), WATCH_MASK)
+            if wd < 0:
+                continue
+            self._watches[wd] = current
+            if not self.recursive:
+                continue
+            try:
+                with os.scandir(current) as entries:
+                    stack.extend(entry.path for entry in entries if entry.is_dir(follow_symlinks=False))
+            except OSError:
+                pass
+
+
+def open_backend(directory, recursive=True, poll_interval=DEFAULT_POLL_INTERVAL, use_inotify=True):
+    if use_inotify and sys.platform.startswith('linux'):
+        try:
+            return InotifyBackend(directory, recursive)
+        except (OSError, AttributeError):
+            pass
+    return PollingBackend(directory, recursive, poll_interval)
+
+
+class FolderWatcher:
+    # Turns raw change notifications into files that are ready to convert:
+    # a file is only handed out once its size and mtime stayed the same for
+    # `settle` seconds, so half copied images are never picked up.
+    def __init__(self, directory, recursive=True, settle=DEFAULT_SETTLE, ignore=(), include_existing=False,
+                 poll_interval=DEFAULT_POLL_INTERVAL, use_inotify=True):
+        self.directory = directory
+        self.settle = settle
+        self.ignore = [path for path in ignore if path]
+        self.backend = open_backend(directory, recursive, poll_interval, use_inotify)
+        self.candidates = {}
+        self.known = {}
+
+        for path in self.backend.paths():
+            if include_existing:
+                self._touch(path)
+            else:
+                state = self._state(path)
+                if state is not None:
+                    self.known[path] = state
+
+    @property
+    def settling(self):
+        return len(self.candidates)
+
+    def poll(self, timeout=0.0):
+        for path in self.backend.changes(timeout):
+            self._touch(path)
+
+        now = time.monotonic()
+        ready = []
+        for path, (state, since) in list(self.candidates.items()):
+            current = self._state(path)
+            if current is None:
+                del self.candidates[path]
+            elif current != state:
+                self.candidates[path] = (current, now)
+            elif now - since >= self.settle:
+                del self.candidates[path]
+                if self.known.get(path) != current:
+                    self.known[path] = current
+                    ready.append(path)
+        return ready
+
+    def close(self):
+        self.backend.close()
+
+    def _touch(self, path):
+        if not is_supported(path) or any(is_under(path, ignored) for ignored in self.ignore):
+            return
+        state = self._state(path)
+        if state is not None and path not in self.candidates:
+            self.candidates[path] = (state, time.monotonic())
+
+    def _state(self, path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return (stat.st_size, stat.st_mtime_ns)
+
+
+class WatchStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.success = 0
+        self.aborted = 0
+        self.settling = 0
+        self.queued = 0
+        self.in_flight = 0
+        self._recent = deque()
+
+    @property
+    def queue_depth(self):
+        return self.settling + self.queued + self.in_flight
+
+    @property
+    def throughput(self):
+        # Files per second over the last THROUGHPUT_WINDOW seconds.
+        now = time.perf_counter()
+        while self._recent and now - self._recent[0] > THROUGHPUT_WINDOW:
+            self._recent.popleft()
+        window = min(THROUGHPUT_WINDOW, now - self.started)
+        return len(self._recent) / window if window > 0 else 0.0
+
+    def update(self, result):
+        self._recent.append(time.perf_counter())
+        if result.ok:
+            self.success += 1
+        else:
+            self.aborted += 1
+
+    def as_dict(self):
+        return {
+            'success': self.success,
+            'aborted': self.aborted,
+            'queue_depth': self.queue_depth,
+            'settling': self.settling,
+            'queued': self.queued,
+            'in_flight': self.in_flight,
+            'throughput': round(self.throughput, 3),
+            'uptime': round(time.perf_counter() - self.started, 3),
+        }
+
+
+class WatchTask(threading.Thread):
+    # Long running counterpart of ConversionTask: one engine and its worker
+    # pool stay up while the watcher feeds them the files as they settle.
+    def __init__(self, directory, output_dir, output_ext, options=None, workers=None, recursive=True,
+                 settle=DEFAULT_SETTLE, include_existing=False, memory_budget=None, metrics=None,
+                 io_workers=DEFAULT_IO_WORKERS, fsync=DEFAULT_FSYNC, use_inotify=True, mirror=False):
+        threading.Thread.__init__(self, daemon=True)
+        self.directory = directory
+        self.output_dir = output_dir
+        self.output_ext = output_ext
+        self.options = options or {}
+        self.workers = workers
+        self.recursive = recursive
+        self.settle = settle
+        self.include_existing = include_existing
+        self.memory_budget = memory_budget
+        self.metrics = metrics
+        self.io_workers = io_workers
+        self.fsync = fsync
+        self.use_inotify = use_inotify
+        self.mirror = mirror
+        self.events = queue.Queue()
+        self.stats = WatchStats()
+        self._ready = deque()
+        self._owners = {}
+        self._directories = set()
+        self._cancel_event = threading.Event()
+
+    @property
+    def is_cancelled(self):
+        return self._cancel_event.is_set()
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    def run(self):
+        watcher = None
+        try:
+            watcher = FolderWatcher(self.directory, self.recursive, self.settle, ignore=[self.output_dir],
+                                    include_existing=self.include_existing, use_inotify=self.use_inotify)
+            self.events.put(('watching', type(watcher.backend).__name__))
+
+            with ConversionEngine(workers=self.workers, memory_budget=self.memory_budget, io_workers=self.io_workers,
+                                  fsync=self.fsync) as engine:
+                for result in engine.run(self._jobs(watcher), cancel_event=self._cancel_event):
+                    self.stats.in_flight -= 1
+                    self.stats.update(result)
+                    if self.metrics is not None:
+                        self.metrics.record(result)
+                    self.events.put(('result', result))
+        except Exception as e:
+            self.events.put(('error', e))
+        finally:
+            if watcher is not None:
+                watcher.close()
+            if self.metrics is not None:
+                self.metrics.close()
+
+        self.events.put(('finished', self.stats))
+
+    def _jobs(self, watcher):
+        last_stats = 0.0
+        while True:
+            if not self._ready:
+                self._ready.extend(watcher.poll())
+
+            now = time.monotonic()
+            if now - last_stats >= STATS_INTERVAL:
+                last_stats = now
+                self.stats.settling = watcher.settling
+                self.stats.queued = len(self._ready)
+                self.events.put(('stats', self.stats.as_dict()))
+
+            if not self._ready:
+                yield None
+                continue
+
+            jobs = make_jobs([self._ready.popleft()], self.output_dir, self.output_ext, self.options,
+                             root=self.directory if self.mirror else None)
+            for source, target, new_target in resolve_collisions(jobs, self._owners):
+                self.events.put(('renamed', [(source, target, new_target)]))
+            try:
+                prepare_directories(jobs, self._directories)
+            except OSError:
+                # Left to the conversion, which reports it for this file.
+                pass
+            self.stats.queued = len(self._ready)
+            self.stats.in_flight += 1
+            yield jobs[0]
+
+    def drain(self, limit=500):
+        events = []
+        try:
+            while len(events) < limit:
+                events.append(self.events.get_nowait())
+        except queue.Empty:
+            pass
+        return events
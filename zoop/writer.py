@@ -0,0 +1,129 @@
+import os
+import time
+import shutil
+import threading
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+
+FSYNC_POLICIES = ['never', 'file', 'full']
+DEFAULT_FSYNC = 'never'
+DEFAULT_IO_WORKERS = 4
+DEFAULT_MAX_PENDING_BYTES = 64 * 1024 * 1024
+TEMP_SUFFIX = '.zooptmp'
+COPY_CHUNK = 1024 * 1024
+
+
+def fsync_directory(path):
+    # Makes the rename itself durable, not possible on Windows.
+    try:
+        fd = os.open(path or '.', os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+@contextlib.contextmanager
+def atomic_output(path, fsync=DEFAULT_FSYNC):
+    # Outputs are written next to their target and renamed over it once
+    # complete, so an interrupted conversion never leaves a truncated file
+    # that looks converted.
+    temp_path = path + TEMP_SUFFIX
+    try:
+        with open(temp_path, 'wb') as f:
+            yield f
+            if fsync != 'never':
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(temp_path)
+        raise
+
+    if fsync == 'full':
+        fsync_directory(os.path.dirname(path))
+
+
+def copy_output(source, target, fsync=DEFAULT_FSYNC):
+    # Streamed in chunks, the file is never held in memory as a whole.
+    with open(source, 'rb') as src, atomic_output(target, fsync) as f:
+        shutil.copyfileobj(src, f, COPY_CHUNK)
+
+
+def link_or_copy(source, target, mode='link', fsync=DEFAULT_FSYNC):
+    # Hard links fall back to a copy across filesystems or where links are
+    # not supported. Either way the target is only replaced once complete.
+    if os.path.normcase(os.path.abspath(source)) == os.path.normcase(os.path.abspath(target)):
+        return
+
+    if mode == 'link':
+        temp_path = target + TEMP_SUFFIX
+        try:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(temp_path)
+            os.link(source, temp_path)
+        except OSError:
+            pass
+        else:
+            os.replace(temp_path, target)
+            if fsync == 'full':
+                fsync_directory(os.path.dirname(target))
+            return
+
+    copy_output(source, target, fsync)
+
+
+class OutputWriter:
+    # Encoded outputs come back from the worker processes as bytes and are
+    # written here by a few threads, so a slow disk or network share only
+    # holds up the writes and never the encoders. Once max_pending_bytes
+    # are waiting, the engine stops submitting new conversions until the
+    # writes catch up. Outputs copied from their source come back as an
+    # object with a size and a write(target, fsync) method instead, and
+    # count the bytes they will write.
+    def __init__(self, workers=DEFAULT_IO_WORKERS, max_pending_bytes=DEFAULT_MAX_PENDING_BYTES, fsync=DEFAULT_FSYNC):
+        self.fsync = fsync
+        self.max_pending_bytes = max_pending_bytes
+        self.pending_bytes = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='zoop-writer')
+
+    @property
+    def is_full(self):
+        return self.pending_bytes >= self.max_pending_bytes
+
+    def submit(self, result):
+        size = sum(len(data) if isinstance(data, bytes) else data.size for _, data in result.payloads)
+        with self._lock:
+            self.pending_bytes += size
+        return self._executor.submit(self._write, result, size)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    def _write(self, result, size):
+        start = time.perf_counter()
+        try:
+            for target, data in result.payloads:
+                if isinstance(data, bytes):
+                    with atomic_output(target, self.fsync) as f:
+                        f.write(data)
+                else:
+                    result.output_bytes += data.write(target, self.fsync)
+        except Exception as e:
+            result.ok = False
+            result.error = '{}: {}'.format(type(e).__name__, e)
+        finally:
+            result.payloads = []
+            with self._lock:
+                self.pending_bytes -= size
+
+        elapsed = time.perf_counter() - start
+        result.timings['write'] = result.timings.get('write', 0.0) + elapsed
+        result.elapsed += elapsed
+        return result